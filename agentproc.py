@@ -0,0 +1,125 @@
+import os
+import time
+import random
+import asyncio
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import misc
+import sim
+
+
+def agent_worker(conn, ai_class, max_turns, seed, process_seed):
+    # runs in the agent's own process, answering one update per request
+    random.seed(process_seed)
+    ai = sim.new_agent(ai_class, max_turns, seed)
+    conn.send("READY")
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            sim.close_agent(ai)
+            break
+        if request == "STATS":
+            conn.send(sim.agent_stats(ai))
+            continue
+        # each answer says which shared memory the agent has made so far, so it
+        # can still be cleaned up if the agent has to be killed
+        try:
+            conn.send(("OK", ai.update(*request), shared_blocks(ai)))
+        except Exception as e:
+            conn.send(("ERROR", e, shared_blocks(ai)))
+
+
+def shared_blocks(ai):
+    # agents without a shared map, like the template's, have none to report
+    blocks = getattr(ai, "sharedBlocks", None)
+    return blocks() if blocks is not None else []
+
+
+# Runs an AI in a persistent subprocess and passes it percepts and messages over
+# a pipe. update works like the AI's own, but raises AgentTimeoutException if the
+# agent takes longer than the deadline (in seconds) to answer.
+class AgentProcess:
+
+    def __init__(self, ai_class, max_turns=None, deadline=None, seed=None):
+        self.deadline = deadline
+        self.answered = None # when the last update_async got its answer
+        self.blocks = []
+        self.conn, child_conn = multiprocessing.Pipe()
+
+        # agents share memory with each other, which should only be cleaned up
+        # once, so they need to share a resource tracker rather than start their own
+        if os.name == "posix":
+            resource_tracker.ensure_running()
+
+        # an unseeded agent uses the random module, which is seeded from ours
+        # so runs still repeat
+        self.process = multiprocessing.Process(
+            target=agent_worker,
+            args=(child_conn, ai_class, max_turns, seed, random.getrandbits(64)),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+        # building the AI doesn't count against the first turn
+        self.conn.recv()
+
+    def update(self, percepts, msg):
+        self.conn.send((percepts, msg))
+        return self.receive(self.conn.poll(self.deadline))
+
+    async def update_async(self, percepts, msg):
+        # the same as update, but waits for the answer without blocking the event loop
+        self.answered = None
+        self.conn.send((percepts, msg))
+        loop = asyncio.get_running_loop()
+        ready, self.answered = await loop.run_in_executor(None, self.wait)
+        return self.receive(ready)
+
+    def wait(self):
+        # whether the agent answered in time, and when, which can be a while
+        # before the event loop gets back to us
+        return self.conn.poll(self.deadline), time.perf_counter()
+
+    def receive(self, ready):
+        if not ready:
+            # the agent is still thinking, and we can't trust it to stop
+            self.process.kill()
+            self.process.join()
+            self.unlink_blocks()
+            raise misc.AgentTimeoutException(f"Agent did not answer within {self.deadline} seconds.")
+
+        status, result, self.blocks = self.conn.recv()
+        if status == "ERROR":
+            raise result
+        return result
+
+    def stats(self):
+        # the agent's counters, or nothing if it had to be stopped
+        if not self.process.is_alive():
+            return {}
+        self.conn.send("STATS")
+        return self.conn.recv()
+
+    def close(self):
+        # ask the agent to stop, but don't wait on one that won't
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+                self.unlink_blocks()
+        self.conn.close()
+
+    def unlink_blocks(self):
+        # a killed agent never gets to free the shared memory it made, so we do
+        for name in self.blocks:
+            try:
+                block = shared_memory.SharedMemory(name)
+            except FileNotFoundError:
+                continue
+            block.close()
+            block.unlink()
+        self.blocks = []
@@ -62,11 +62,10 @@
 # As a result, the memory is now something like severallinked 2d lists, which can
 # grow independantly and merge when a landmark is found.
 
-import random
 import math
-from aiDependancies.tile import Tile, tileCategories
-from aiDependancies.map import Map, directionCoordinates, directionOpposites
+from aiDependancies.tile import tileCategories
 from aiDependancies.aiBase import AI as BaseAI
+from aiDependancies.sharedMap import SharedMap
 
 class AI (BaseAI):
     def update(self, percepts, msg):
@@ -95,22 +94,28 @@ class AI (BaseAI):
         """
         self.turn += 1
         
+        if self.print: print(f"A received the message: {msg}")
+
+        # this agent sets up the map they share, and takes in what the other has seen
+        if self.turn == 0:
+            self.shared = SharedMap()
+        self.shared.ingest(self.memory)
+
         # update location to match the map, in case the other agent
         # messed something up
         if self.location is not self.memory.tileAt(*self.location.relativePosition):
             self.location = self.memory.tileAt(*self.location.relativePosition)
-
-        if self.print: print(f"A received the message: {msg}")
         
         # the other agent's path, so it can be avoided
         pathOther = [self.location]
         if msg:
-            pathOther = self.getPath(*msg)
+            pathOther = self.otherPath(msg)
         
         # if the agent ever reaches a goal, use it no matter what
         if tileCategories[percepts['X'][0]] in ("GOAL"):
             self.move('U')
-            return 'U', ( self.memory if self.turn == 0 else (self.location, self.nextActions) )
+            plan = self.message()
+            return 'U', ( self.shared.name if self.turn == 0 else plan )
         
         # for each percept
         for direction, tiles in percepts.items():
@@ -118,15 +123,12 @@ class AI (BaseAI):
             # (except X)
             if direction == 'X': continue
 
-            # add the tile to memory
-            for i in range(len(tiles)):
-                tileLocation = (
-                    self.location.relativePosition[0] + (i+1)*directionCoordinates[direction][0],
-                    self.location.relativePosition[1] + (i+1)*directionCoordinates[direction][1],
-                    self.location.relativePosition[2]
-                )
-                t = Tile(tileLocation[0], tileLocation[1], tiles[i], tileLocation[2])
-                self.memory.rememberTile(t, t.type == 'g')
+            # add any new or changed tiles to memory
+            self.memory.rememberRay(*self.location.relativePosition, direction, tiles)
+
+        # merging layers can replace the tile we are standing on
+        if self.location is not self.memory.tileAt(*self.location.relativePosition):
+            self.location = self.memory.tileAt(*self.location.relativePosition)
 
         # print the current state of memory, if enabled
         # if self.print: self.memory.print()
@@ -146,7 +148,7 @@ class AI (BaseAI):
             self.nextActions = self.memory.bft(
                 *self.location.relativePosition,
                 lambda tile: tile.hasUnknowns(),
-                lambda KVPair: 3*random.random() + KVPair[1].numUnknowns() / 2 - math.dist(KVPair[1].relativePosition, pathOther[-1].relativePosition)
+                lambda KVPair: 3*self.random.random() + KVPair[1].numUnknowns() / 2 - math.dist(KVPair[1].relativePosition, pathOther[-1].relativePosition)
             )
 
         if self.print: print("A next actions:", self.nextActions)
@@ -161,5 +163,6 @@ class AI (BaseAI):
         # update our position
         self.move(choice)
         
-        # return a map first, and our intended path after that
-        return choice, ( self.memory if self.turn == 0 else (self.location, self.nextActions) )
\ No newline at end of file
+        # return where to find the shared map first, and our intended path after that
+        plan = self.message()
+        return choice, ( self.shared.name if self.turn == 0 else plan )
\ No newline at end of file
@@ -56,11 +56,9 @@
 #
 
 
-import random
 import math
-from aiDependancies.tile import Tile, tileCategories
-from aiDependancies.map import Map, directionCoordinates, directionOpposites
 from aiDependancies.aiBase import AI as BaseAI
+from aiDependancies.sharedMap import SharedMap
 
 class AI (BaseAI):
     def update(self, percepts, msg):
@@ -89,22 +87,23 @@ class AI (BaseAI):
         """
         self.turn += 1
         
+        if self.print: print(f"B received the message: {msg}")
+        
+        # link maps if it gets one
+        if isinstance(msg, str):
+            self.shared = SharedMap(msg)
+            msg = None
+        if self.shared:
+            self.shared.ingest(self.memory)
+
         # update location to match the map, in case the other agent
         # messed something up
         if self.location is not self.memory.tileAt(*self.location.relativePosition):
             self.location = self.memory.tileAt(*self.location.relativePosition)
 
-        if self.print: print(f"B received the message: {msg}")
-        
         pathOther = [self.location]
         if msg:
-            # link maps if it gets one
-            if type(msg) == Map:
-                self.memory = msg
-                # TODO make it not break everything if this isnt on the map
-                self.location = self.memory.tileAt(*self.location.relativePosition)
-            else:
-                pathOther = self.getPath(*msg)
+            pathOther = self.otherPath(msg)
         
         # for each percept
         for direction, tiles in percepts.items():
@@ -112,15 +111,12 @@ class AI (BaseAI):
             # (except X)
             if direction == 'X': continue
 
-            # add the tile to memory
-            for i in range(len(tiles)):
-                tileLocation = (
-                    self.location.relativePosition[0] + (i+1)*directionCoordinates[direction][0],
-                    self.location.relativePosition[1] + (i+1)*directionCoordinates[direction][1],
-                    self.location.relativePosition[2]
-                )
-                t = Tile(tileLocation[0], tileLocation[1], tiles[i], tileLocation[2])
-                self.memory.rememberTile(t, t.type == 'g')
+            # add any new or changed tiles to memory
+            self.memory.rememberRay(*self.location.relativePosition, direction, tiles)
+
+        # merging layers can replace the tile we are standing on
+        if self.location is not self.memory.tileAt(*self.location.relativePosition):
+            self.location = self.memory.tileAt(*self.location.relativePosition)
 
         # print the current state of memory, if enabled
         if self.print: self.memory.print()
@@ -136,14 +132,13 @@ class AI (BaseAI):
         
         # if there is no plan, make one
         if (not self.nextActions or self.turn % 5 == 0) and not self.escaping:
-            goals = list(filter(lambda t: t.tileCategory == "GOAL", self.memory.landmarks.values()))
+            goals = [cellType for cellType, t in self.memory.landmarks.items() if t.tileCategory == "GOAL"]
 
             # by going to the closest goal
             if goals:
-                # can make this faster with a* or smth
-                self.nextActions = self.memory.bft(
-                    *self.location.relativePosition,
-                    lambda tile: tile.tileCategory == "GOAL"
+                self.nextActions = self.memory.pathTo(
+                    goals,
+                    *self.location.relativePosition
                 ) + ['U']
             else:
                 # or by finding the closest unknown tile
@@ -155,7 +150,7 @@ class AI (BaseAI):
                 self.nextActions = self.memory.bft(
                     *self.location.relativePosition,
                     lambda tile: tile.hasUnknowns(),
-                    lambda KVPair: 3*random.random() + KVPair[1].numUnknowns() / 2 - math.dist(KVPair[1].relativePosition, pathOther[-1].relativePosition)
+                    lambda KVPair: 3*self.random.random() + KVPair[1].numUnknowns() / 2 - math.dist(KVPair[1].relativePosition, pathOther[-1].relativePosition)
                 )
 
         if self.print: print("B next actions:", self.nextActions)
@@ -170,5 +165,5 @@ class AI (BaseAI):
         # update our position
         self.move(choice)
 
-        # return a map first, and our intended path after that
-        return choice, (self.location, self.nextActions)
\ No newline at end of file
+        # share what we've seen, and our intended path
+        return choice, self.message()
\ No newline at end of file
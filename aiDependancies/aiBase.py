@@ -1,9 +1,10 @@
 import math
-from aiDependancies.tile import Tile, tileCategories
-from aiDependancies.map import Map, directionCoordinates, directionOpposites
+import random
+from aiDependancies.tile import Tile
+from aiDependancies.map import Map
 
 class AI:
-    def __init__(self, max_turns):
+    def __init__(self, max_turns, seed=None):
         """
         Called once before the sim starts. You may use this function
         to initialize any data or data structures you need.
@@ -11,10 +12,15 @@ class AI:
 
         self.print = False
 
+        # with a seed the agent has random numbers of its own, so runs repeat,
+        # otherwise it shares the random module with everything else
+        self.random = random.Random(seed) if seed is not None else random
+
         self.turn = -1
         self.location = Tile() # tile object
-        self.memory = Map()    # map of agent's memory
+        self.memory = Map(rng=self.random) # map of agent's memory
         self.memory.rememberTile(self.location)
+        self.shared = None     # map shared with the other agent, once there is one
 
         self.timeToGoal = math.inf
         self.timeGoalLastChecked = 0
@@ -30,13 +36,15 @@ class AI:
             # and we might not have time to do other stuff
             if self.timeToGoal + self.turn * 2 - self.timeGoalLastChecked + 1 >= self.maxTurns:
                 if self.print: print("time check at", self.turn)
-                # find the absolute fastest route to the goal
-                escapeRoute = self.memory.bft(
-                    *self.location.relativePosition,
-                    lambda tile: tile.tileCategory == "EXIT"
-                ) + ['U']
+                # the distance to the exit is kept up to date in memory
+                distance = self.memory.distanceTo('r', *self.location.relativePosition)
+
+                # no known route to the exit yet, so there is nothing to escape along
+                if distance == math.inf:
+                    return None
+
                 # update our times
-                self.timeToGoal = len(escapeRoute)
+                self.timeToGoal = distance + 1
                 self.timeGoalLastChecked = self.turn
 
                 if self.print: print("time to exit", self.timeToGoal)
@@ -44,16 +52,44 @@ class AI:
                 # if we were right and do need to leave, GET OUT
                 if self.timeToGoal + self.turn * 2 - self.timeGoalLastChecked + 1 >= self.maxTurns:
                     self.escaping = True
-                    return escapeRoute
+                    return self.memory.pathTo(['r'], *self.location.relativePosition) + ['U']
         return None
     
+    def message(self):
+        # share what we've seen, and say where we are and what we plan to do
+        if self.shared: self.shared.publish(self.memory)
+        return (self.memory.exportPosition(*self.location.relativePosition), "".join(self.nextActions))
+
+    def otherPath(self, msg):
+        # the tiles the other agent plans to walk through, from its message
+        position, moves = msg
+        start = self.memory.tileAt(*self.memory.importPosition(*position))
+        if start is None:
+            return [self.location]
+        return self.getPath(start, moves)
+
+    def stats(self):
+        # counters for profiling
+        return {
+            "search expansions": self.memory.expansions,
+            "tiles stored": self.memory.tilesStored
+        }
+
+    def close(self):
+        # let go of the map shared with the other agent
+        if self.shared: self.shared.close()
+
+    def sharedBlocks(self):
+        # names of the shared memory blocks we made, which only we can free
+        return [block.name for block in self.shared.owned] if self.shared else []
+
     def getPath(self, start: Tile, moves: list):
         # builds a path by simulating stepping through known territory
         result = [start]
         for move in moves:
-            if move in result[-1].relations.keys():
-                if result[-1].relations[move]:
-                    result.append(result[-1].relations[move])
+            if result[-1].hasDirection(move):
+                if result[-1].neighbor(move):
+                    result.append(result[-1].neighbor(move))
             else:
                 result.append(result[-1])
         return result
@@ -61,13 +97,14 @@ class AI:
     def move(self, inp: str):
         # update our memory if we grab a goal
         if inp == 'U' and self.location.tileCategory == "GOAL":
-            del self.memory.landmarks[self.location.type]
-            self.location.type = 'g'
-            self.location.tileCategory = tileCategories['g']
+            # the landmark may already be gone, if a merge replaced it
+            self.memory.forgetLandmark(self.location.type)
+            self.location.setType('g')
+            self.memory.changes.append(self.location)
         
         # otherwise move if possible
-        elif inp in self.location.relations.keys():
-            destination = self.location.relations[inp]
+        elif self.location.hasDirection(inp):
+            destination = self.location.neighbor(inp)
 
             # if the agent doesn't hit a wall when trying to move, update its position
             if destination and destination.type != 'w':
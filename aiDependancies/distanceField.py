@@ -0,0 +1,87 @@
+from collections import deque
+import math
+
+# distances from every known tile to one landmark, kept across turns and
+# repaired as new tiles are linked in instead of searching again every replan
+class DistanceField:
+	def __init__(self, memory, targetType):
+		self.memory = memory         # the Map this field belongs to
+		self.targetType = targetType # landmark the distances lead to
+		self.target = None           # position of the landmark when the field was built
+		self.distances = {}          # position -> steps to the landmark
+		self.pending = set()         # positions linked since the last sync
+		self.version = -1            # map version the field is up to date with
+		self.stale = True            # set when positions shift and only a rebuild will do
+
+	def sync(self):
+		# bring the field up to date with the map, as cheaply as possible
+		target = self.memory.landmarks[self.targetType].relativePosition
+		if self.stale or target != self.target:
+			self.rebuild(target)
+		elif self.version != self.memory.version:
+			self.repair()
+		self.version = self.memory.version
+
+	def rebuild(self, target):
+		self.target = target
+		self.distances = {target: 0}
+		self.pending.clear()
+		self.stale = False
+		self.propagate(deque([target]))
+
+	def repair(self):
+		# new tiles and links only ever make paths shorter, so pull each changed
+		# tile down to its best neighbor and push any improvement outwards. the
+		# Map marks the field stale instead whenever a link or landmark goes away
+		distances = self.distances
+		frontier = deque()
+		for position in self.pending:
+			if not self.memory.isOpen(position):
+				continue
+
+			best = distances.get(position, math.inf)
+			for direction, neighbor in self.memory.neighborPositions(position):
+				best = min(best, distances.get(neighbor, math.inf) + 1)
+
+			if best < math.inf:
+				distances[position] = best
+				frontier.append(position)
+
+		self.pending.clear()
+		self.propagate(frontier)
+
+	def propagate(self, frontier):
+		# relax outwards from positions whose distance is known
+		distances = self.distances
+		while frontier:
+			position = frontier.popleft()
+			nextDistance = distances[position] + 1
+			for direction, neighbor in self.memory.neighborPositions(position):
+				if nextDistance < distances.get(neighbor, math.inf):
+					distances[neighbor] = nextDistance
+					frontier.append(neighbor)
+
+	def distance(self, x, y, layer):
+		return self.distances.get((x, y, layer), math.inf)
+
+	def nextStep(self, position):
+		# a move to a neighbor one step closer to the landmark, as (direction, position)
+		distance = self.distances.get(position, math.inf)
+		for direction, neighbor in self.memory.neighborPositions(position):
+			if self.distances.get(neighbor, math.inf) == distance - 1:
+				return direction, neighbor
+		return None
+
+	def pathFrom(self, x, y, layer):
+		# follow the field down to the landmark, None if it can't be reached
+		position = (x, y, layer)
+		if position not in self.distances:
+			return None
+		path = []
+		while self.distances[position] > 0:
+			step = self.nextStep(position)
+			if step is None:
+				return None
+			direction, position = step
+			path.append(direction)
+		return path
@@ -1,4 +1,9 @@
-from aiDependancies.tile import Tile, transporterPairs
+from aiDependancies.tile import Tile, transporterPairs, EXIT, TRANSPORTER, GOAL, WALL
+from aiDependancies.distanceField import DistanceField
+from collections import deque
+import heapq
+import itertools
+import math
 import random
 
 # define how cardinal directions are oriented in the agent's map
@@ -17,99 +22,210 @@ directionOpposites = {
     'W': 'E'
 }
 
+# layers are stored as square chunks of tiles, keyed by chunk coordinate, so
+# the map can grow in any direction without shifting what is already stored
+CHUNK_BITS = 4
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# every layer is laid out around a physical cell both agents can agree on: the
+# first layer around the start, and each new layer around the transporter it was
+# made for, which sits at (0, 0). positions are shared relative to these anchors
+START_ANCHOR = '@'
+
+# grid distance between two positions, or 0 if they are on unlinked layers
+def manhattan(p1, p2):
+	if p1[2] != p2[2]:
+		return 0
+	return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
+
 class Map:
-	def __init__(self, layer = 0):
-		self.data = [[]]       # map data stored sideways relative to the world, (y, x)
+	def __init__(self, layer = 0, rng = random):
+		self.data = [{}]        # chunks of each layer, (chunk x, chunk y) -> tiles stored row by row
 		self.origins = [[0, 0]] # coordinate of "top-left" tile in map, (x, y)
 		self.sizes = [[0, 0]]   # bounds of map, (x, y)
 		self.landmarks = {}
 		self.mergedLayers = []
+		self.layerParents = [0]       # layer each layer was merged into, or itself (a disjoint set)
+		self.layerOffsets = [(0, 0)]  # offset from each layer's coordinates into its parent's
+		self.layerCounts = [0]        # number of tiles stored on each layer
+		self.layerAnchors = [START_ANCHOR] # cell each layer is laid out around
+		self.changes = []         # tiles stored since they were last shared
+		self.expansions = 0       # tiles taken off a search frontier, for profiling
+		self.tilesStored = 0      # tiles stored from percepts or the other agent, for profiling
+		self.random = rng         # random number source, the random module unless seeded
+		self.version = 0          # bumped whenever tiles are linked or moved
+		self.distanceFields = {}  # cached distances to landmarks, by landmark type
 	
 	# function to handle expanding map to accomidate new information, if necessary
 	def rememberTile(self, t: Tile = Tile(), update = False):
+		# a tile seen on a layer that has since been merged (e.g. further along a
+		# ray that merged it) is stored where that layer went
+		if t.relativePosition[2] < len(self.layerParents):
+			t.relativePosition = self.canonicalPosition(*t.relativePosition)
 		self.expandMapForTile(t)
 		
 		# once expanded, store the tile data
 		if (self.tileAt(*t.relativePosition) == None or update):
 			self.setTile(t)
+			self.changes.append(t)
+			self.tilesStored += 1
 		else:
 			t = self.tileAt(*t.relativePosition)
 		
 		# if there are ever 2 landmarks, we found a way to merge layers!
-		if (t.tileCategory in ("GOAL", "TRANSPORTER", "EXIT")):
+		if (t.category in (GOAL, TRANSPORTER, EXIT)):
 			if (t.type not in self.landmarks):
 				self.landmarks[t.type] = t
-			elif t.relativePosition[2] != self.landmarks[t.type].relativePosition[2]:
+			elif self.findLayer(t.relativePosition[2])[0] != self.findLayer(self.landmarks[t.type].relativePosition[2])[0]:
 				self.mergeLayers(t.relativePosition, self.landmarks[t.type].relativePosition)
 				t = self.landmarks[t.type]
 
 		# register which directions of the tile are known and which are not
 		self.updateRelations(self.tileAt(*t.relativePosition))
 
+	def rememberRay(self, x, y, layer, direction, cells):
+		# remember a line of percepts starting next to (x, y), but only build tiles
+		# for cells that are new or have changed since they were last seen
+		dx, dy = directionCoordinates[direction]
+		for i in range(len(cells)):
+			tx = x + (i+1)*dx
+			ty = y + (i+1)*dy
+			self.rememberCell(tx, ty, layer, cells[i])
+
+	def rememberCell(self, x, y, layer, cellType):
+		# remember one cell, unless it is already known to look like that
+		known = self.tileAt(x, y, layer)
+		if known and known.type == cellType:
+			return
+
+		# a landmark that has changed (a goal being picked up) is gone
+		if known and self.landmarks.get(known.type) is known:
+			self.forgetLandmark(known.type)
+
+		t = Tile(x, y, cellType, layer)
+		self.rememberTile(t, t.type == 'g')
+
+	def exportPosition(self, x, y, layer):
+		# a position as (x, y, anchor), which means the same thing in any Map
+		x, y, layer = self.canonicalPosition(x, y, layer)
+		return (x, y, self.layerAnchors[layer])
+
+	def importPosition(self, x, y, anchor):
+		# the position in this Map of an exported one
+		if anchor == START_ANCHOR:
+			base = self.canonicalPosition(0, 0, 0)
+		else:
+			# a transporter we've never heard of gets a layer of its own, as if we'd
+			# just seen its pair
+			if anchor not in self.landmarks:
+				self.landmarks[anchor] = Tile(0, 0, anchor, len(self.data))
+				self.rememberTile(self.landmarks[anchor])
+			base = self.canonicalPosition(*self.landmarks[anchor].relativePosition)
+		return (base[0] + x, base[1] + y, base[2])
+
+	def findLayer(self, layer):
+		# the layer a layer has been merged into, and the offset into its coordinates
+		path = []
+		while self.layerParents[layer] != layer:
+			path.append(layer)
+			layer = self.layerParents[layer]
+
+		# point everything on the way straight at the root for next time
+		dx, dy = 0, 0
+		for child in reversed(path):
+			dx += self.layerOffsets[child][0]
+			dy += self.layerOffsets[child][1]
+			self.layerOffsets[child] = (dx, dy)
+			self.layerParents[child] = layer
+
+		if path:
+			return layer, self.layerOffsets[path[0]]
+		return layer, (0, 0)
+
+	def canonicalPosition(self, x, y, layer):
+		# where a position on a possibly merged layer lives now
+		root, offset = self.findLayer(layer)
+		return (x + offset[0], y + offset[1], root)
+
 	def mergeLayers(self, p1, p2):
+		p1 = self.canonicalPosition(*p1)
+		p2 = self.canonicalPosition(*p2)
+
 		# dont merge if we dont have to
 		if p1[2] == p2[2]:
 			return
 
-		# find the difference in origins
-		offset = None
-		mergeLayer = -1
-		obsoleteLayer = -1
-		if p1[2] < p2[2]:
-			offset = (
-				p1[0] - p2[0],
-				p1[1] - p2[1]
-			)
-			mergeLayer = p1[2]
-			obsoleteLayer = p2[2]
+		# every position on the old layer is about to change
+		self.version += 1
+		self.invalidateFields()
+
+		# keep the bigger layer and move the smaller one onto it, so a tile is
+		# only ever moved when the layer it ends up on at least doubles
+		if self.layerCounts[p1[2]] >= self.layerCounts[p2[2]]:
+			mergeLayer, obsoleteLayer = p1[2], p2[2]
+			offset = (p1[0] - p2[0], p1[1] - p2[1])
 		else:
-			offset = (
-				p2[0] - p1[0],
-				p2[1] - p1[1]
-			)
-			mergeLayer = p2[2]
-			obsoleteLayer = p1[2]
-		
+			mergeLayer, obsoleteLayer = p2[2], p1[2]
+			offset = (p2[0] - p1[0], p2[1] - p1[1])
+
+		# positions on the old layer now resolve through the new one
+		self.layerParents[obsoleteLayer] = mergeLayer
+		self.layerOffsets[obsoleteLayer] = offset
+
 		# relocate each tile on the old layer
-		for line in self.data[obsoleteLayer]:
-			for tile in line:
+		moved = []
+		for chunk in self.data[obsoleteLayer].values():
+			for tile in chunk:
 				if tile:
-					newPosition = [
+					tile.relativePosition = (
 						tile.relativePosition[0] + offset[0],
 						tile.relativePosition[1] + offset[1],
 						mergeLayer
-					]
-					
-					tile.relativePosition = newPosition
-					oldTile = self.tileAt(*newPosition)
-					
+					)
+
+					# don't leave a landmark pointing at a tile that is being replaced,
+					# unless what replaces it is something else, then it's just gone
+					oldTile = self.tileAt(*tile.relativePosition)
+					if oldTile and self.landmarks.get(oldTile.type) is oldTile:
+						if tile.type == oldTile.type:
+							self.landmarks[oldTile.type] = tile
+						else:
+							self.forgetLandmark(oldTile.type)
+
 					self.expandMapForTile(tile)
 					self.setTile(tile)
-		
-		# and link them up
-		for line in self.data[mergeLayer]:
-			for tile in line:
-				if tile:
-					self.updateRelations(tile)
-		# self.data[obsoleteLayer] = []
+					moved.append(tile)
+
+		# the old layer's storage is no longer needed
+		self.data[obsoleteLayer] = {}
+		self.layerCounts[obsoleteLayer] = 0
+
+		# and link the moved tiles up, which links their new neighbors back too
+		for tile in moved:
+			self.updateRelations(tile)
 		
 		# remind us to not print the layer again
 		self.mergedLayers.append(obsoleteLayer)
 
 	def updateRelations(self, tile: Tile):
+		# let the distance fields know this tile needs another look
+		self.version += 1
+		for field in self.distanceFields.values():
+			field.pending.add(tile.relativePosition)
 
 		# add each neighbor as a linked list reference
 		for direction, offset in directionCoordinates.items():
 			opposite = directionOpposites[direction]
 			neighbor = self.tileAt(tile.relativePosition[0] + offset[0], tile.relativePosition[1] + offset[1], tile.relativePosition[2])
 
-			tile.relations[direction] = neighbor
+			tile.setNeighbor(direction, neighbor)
 			if neighbor:
-				neighbor.relations[opposite] = tile
+				neighbor.setNeighbor(opposite, tile)
 				
 		
 		# and add the extra transporter dimension
-		if tile.tileCategory == "TRANSPORTER":
+		if tile.category == TRANSPORTER:
 			other = transporterPairs[tile.type]
 
 			if tile.type not in self.landmarks.keys():
@@ -119,93 +235,230 @@ class Map:
 				self.landmarks[other] = Tile(0, 0, other, len(self.data))
 				self.rememberTile(self.landmarks[other])
 
-			tile.relations['U'] = self.landmarks[other]
-			self.landmarks[other].relations['U'] = self.landmarks[tile.type]
+			tile.setNeighbor('U', self.landmarks[other])
+			self.landmarks[other].setNeighbor('U', self.landmarks[tile.type])
 
 	# since memory is not indexed with coordinates, just make a function to avoid mistakes
 	def tileAt(self, x, y, layer = 0):
-		if not (layer in range(len(self.sizes)) and x in range(self.origins[layer][0], self.origins[layer][0]+self.sizes[layer][0]) and y in range(self.origins[layer][1], self.origins[layer][1]+self.sizes[layer][1])): return None
-		return self.data[layer][y-self.origins[layer][1]][x-self.origins[layer][0]]
+		if not 0 <= layer < len(self.data): return None
+		if self.layerParents[layer] != layer: x, y, layer = self.canonicalPosition(x, y, layer)
+		chunk = self.data[layer].get((x >> CHUNK_BITS, y >> CHUNK_BITS))
+		if chunk is None: return None
+		return chunk[((y & CHUNK_MASK) << CHUNK_BITS) | (x & CHUNK_MASK)]
 
 	def setTile(self, t: Tile):
 		x, y, layer = t.relativePosition
-		if not (layer in range(len(self.sizes)) and x in range(self.origins[layer][0], self.origins[layer][0]+self.sizes[layer][0]) and y in range(self.origins[layer][1], self.origins[layer][1]+self.sizes[layer][1])):
+		if not 0 <= layer < len(self.data):
 			return None
-		self.data[layer][y-self.origins[layer][1]][x-self.origins[layer][0]] = t
+		if self.layerParents[layer] != layer:
+			x, y, layer = t.relativePosition = self.canonicalPosition(x, y, layer)
+		key = (x >> CHUNK_BITS, y >> CHUNK_BITS)
+		chunk = self.data[layer].get(key)
+		if chunk is None:
+			chunk = self.data[layer][key] = [None] * (CHUNK_SIZE * CHUNK_SIZE)
+		i = ((y & CHUNK_MASK) << CHUNK_BITS) | (x & CHUNK_MASK)
+		if chunk[i] is None:
+			self.layerCounts[layer] += 1
+		elif chunk[i].type != t.type:
+			# a known cell turning into something else (e.g. a wall) can take
+			# links away, which only a rebuild catches
+			self.invalidateFields()
+		chunk[i] = t
 	
 	def expandMapForTile(self, t: Tile):
-		layer = t.relativePosition[2]
-		# if the tile is "left" of map
+		x, y, layer = t.relativePosition
+		# if the layer doesn't exist yet
 		while (layer >= len(self.data)):
-			self.data.append([])
+			self.layerParents.append(len(self.data))
+			self.layerOffsets.append((0, 0))
+			self.layerCounts.append(0)
+			self.layerAnchors.append(t.type if len(self.data) == layer else None)
+			self.data.append({})
 			self.sizes.append([0, 0])
 			self.origins.append([0, 0])
 
-		# if the tile is "left" of map
-		while (t.relativePosition[0] < self.origins[layer][0]):
-			for i in range(self.sizes[layer][1]): self.data[layer][i].insert(0, None)
-			self.sizes[layer][0] += 1
-			self.origins[layer][0] -= 1
-		
-		# if the tile is "right" of map
-		while (t.relativePosition[0] >= self.origins[layer][0] + self.sizes[layer][0]):
-			for i in range(self.sizes[layer][1]): self.data[layer][i].append(None)
-			self.sizes[layer][0] += 1
-
-		# if the tile is "above" map
-		while (t.relativePosition[1] < self.origins[layer][1]):
-			self.data[layer].insert(0, [None for i in range(self.sizes[layer][0])])
-			self.sizes[layer][1] += 1
-			self.origins[layer][1] -= 1
-		
-		# if the tile is "below" map
-		while (t.relativePosition[1] >= self.origins[layer][1] + self.sizes[layer][1]):
-			self.data[layer].append([None for i in range(self.sizes[layer][0])])
-			self.sizes[layer][1] += 1
+		# chunks are allocated as tiles are stored, so only the bounds need updating
+		origin = self.origins[layer]
+		size = self.sizes[layer]
+		if size[0] == 0:
+			origin[0], origin[1] = x, y
+			size[0], size[1] = 1, 1
+			return
 
-		if self.sizes[0][0] > 100:
-			pass
+		# if the tile is "left" or "right" of map
+		if x < origin[0]:
+			size[0] += origin[0] - x
+			origin[0] = x
+		elif x >= origin[0] + size[0]:
+			size[0] = x - origin[0] + 1
 
-	def bft(self, x = 0, y = 0, layer = 0, condition = lambda tile: tile.hasUnknowns(), priority=lambda KVPair: random.random()):
-		# store the coordinates of "seen" tiles
-		tilesChecked = [(x, y, layer)]
+		# if the tile is "above" or "below" map
+		if y < origin[1]:
+			size[1] += origin[1] - y
+			origin[1] = y
+		elif y >= origin[1] + size[1]:
+			size[1] = y - origin[1] + 1
 
-		# store the visitable tiles alongside the path taken to reach them
-		tileFrontier = [([], self.tileAt(x, y, layer))]
+	def bft(self, x = 0, y = 0, layer = 0, condition = lambda tile: tile.hasUnknowns(), priority = None):
+		if priority is None:
+			priority = lambda KVPair: self.random.random()
+
+		# store how each seen tile was reached, as (previous tile, direction), keyed by coordinate
+		parents = {(x, y, layer): None}
+
+		# store the visitable tiles, in the order they were seen
+		tileFrontier = deque([self.tileAt(x, y, layer)])
 
 		# while there are still unsearched tiles
 		while tileFrontier:
 			# remove a tile
-			currentPath, currentTile = tileFrontier.pop(0)
-			
-			# print(currentTile.relativePosition)
+			currentTile = tileFrontier.popleft()
+			self.expansions += 1
 
 			# move to it if it has an unknown neighbor
 			if condition(currentTile):
-				return currentPath
+				return self.tracePath(parents, currentTile)
 
 			# add unseen neighbors to the frontier if not
-			neighbors = []
-
 			# for each direction (in a random order because determinism is less fun)
-			for direction, destination in sorted(currentTile.relations.items(), key=priority):
-				# add the neighbor in that direction, alongside the updated path to it
-				# this neighbor will always be known, since the function would have already returned otherwise
-
-				neighbors.append([
-					currentPath + [direction],
-					destination
-				])
-			
-			# now, select only those neighbors which are not already in the frontier and aren't walls
-			frontierAdditions = list(filter(lambda t: t[1] and t[1].type != 'w' and t[1].relativePosition not in tilesChecked, neighbors))
-
-			# and add those to the list of seen tiles and the list of visitable tiles
-			tileFrontier.extend(frontierAdditions)
-			tilesChecked.extend([addition[1].relativePosition for addition in frontierAdditions])
+			for direction, destination in sorted(currentTile.neighborItems(), key=priority):
+				# skip unknown tiles, walls, and anything already seen
+				if not destination or destination.category == WALL:
+					continue
+				position = destination.relativePosition
+				if position in parents:
+					continue
+
+				parents[position] = (currentTile, direction)
+				tileFrontier.append(destination)
 		
 		# if nothing is found, walk randomly (this should never happen if the map is completeable)
-		return [random.choice(['N', 'S', 'E', 'W'])]
+		return [self.random.choice(['N', 'S', 'E', 'W'])]
+
+	def aStar(self, x = 0, y = 0, layer = 0, targets = (), useHeuristic = True):
+		# shortest path to the closest of the target tiles
+		goalPositions = [t.relativePosition for t in targets]
+		if not goalPositions:
+			return [self.random.choice(['N', 'S', 'E', 'W'])]
+
+		# transporters are unit-cost shortcuts, so the estimate has to allow for
+		# stepping onto any of them and appearing at whichever one is closest
+		# to a target
+		transporters = [t.relativePosition for t in self.landmarks.values() if t.category == TRANSPORTER]
+		exitCost = min((manhattan(t, g) for t in transporters for g in goalPositions), default=math.inf)
+
+		def estimate(position):
+			if not useHeuristic:
+				return 0
+			direct = min(manhattan(position, g) for g in goalPositions)
+			if transporters:
+				direct = min(direct, min(manhattan(position, t) for t in transporters) + 1 + exitCost)
+			return direct
+
+		start = (x, y, layer)
+		goalPositions = set(goalPositions)
+		parents = {start: None}
+		costs = {start: 0}
+
+		# entries are (estimated total, tiebreak, cost so far, tile)
+		order = itertools.count()
+		tileFrontier = [(estimate(start), next(order), 0, self.tileAt(x, y, layer))]
+
+		while tileFrontier:
+			_, _, cost, currentTile = heapq.heappop(tileFrontier)
+			position = currentTile.relativePosition
+
+			# skip entries that were improved on after they were queued
+			if cost > costs[position]:
+				continue
+			self.expansions += 1
+
+			if position in goalPositions:
+				return self.tracePath(parents, currentTile)
+
+			for direction, destination in currentTile.neighborItems():
+				if not destination or destination.category == WALL:
+					continue
+				neighbor = destination.relativePosition
+				if cost + 1 < costs.get(neighbor, math.inf):
+					costs[neighbor] = cost + 1
+					parents[neighbor] = (currentTile, direction)
+					heapq.heappush(tileFrontier, (cost + 1 + estimate(neighbor), next(order), cost + 1, destination))
+
+		# same fallback as bft
+		return [self.random.choice(['N', 'S', 'E', 'W'])]
+
+	def isOpen(self, position):
+		tile = self.tileAt(*position)
+		return tile is not None and tile.type != 'w'
+
+	def neighborPositions(self, position):
+		# known, walkable positions one move away, as (direction, position)
+		x, y, layer = position
+		for direction, offset in directionCoordinates.items():
+			neighbor = self.tileAt(x + offset[0], y + offset[1], layer)
+			if neighbor and neighbor.type != 'w':
+				yield direction, (x + offset[0], y + offset[1], layer)
+
+		# transporters also lead to their pair, if we know where it is
+		tile = self.tileAt(x, y, layer)
+		if tile and tile.category == TRANSPORTER and transporterPairs[tile.type] in self.landmarks:
+			yield 'U', self.landmarks[transporterPairs[tile.type]].relativePosition
+
+	def invalidateFields(self):
+		# distance fields can only be repaired while links are added, so anything
+		# that takes one away makes them rebuild on their next sync
+		for field in self.distanceFields.values():
+			field.stale = True
+
+	def forgetLandmark(self, cellType):
+		# a landmark that is gone takes its distance field and its transporter
+		# link with it
+		self.distanceFields.pop(cellType, None)
+		if self.landmarks.pop(cellType, None) is not None:
+			self.invalidateFields()
+
+	def distanceField(self, cellType):
+		# up to date distances to a known landmark, or None if it isn't known
+		if cellType not in self.landmarks:
+			self.distanceFields.pop(cellType, None)
+			return None
+
+		if cellType not in self.distanceFields:
+			self.distanceFields[cellType] = DistanceField(self, cellType)
+		field = self.distanceFields[cellType]
+		field.sync()
+		return field
+
+	def distanceTo(self, cellType, x = 0, y = 0, layer = 0):
+		field = self.distanceField(cellType)
+		return field.distance(x, y, layer) if field else math.inf
+
+	def pathTo(self, cellTypes, x = 0, y = 0, layer = 0):
+		# path to the closest of the given landmarks, read off the cached fields
+		fields = [field for field in map(self.distanceField, cellTypes) if field]
+		if fields:
+			field = min(fields, key=lambda f: f.distance(x, y, layer))
+			path = field.pathFrom(x, y, layer)
+			if path is not None:
+				return path
+
+		# fall back to searching if the fields don't lead anywhere
+		return self.aStar(x, y, layer, [self.landmarks[t] for t in cellTypes if t in self.landmarks])
+
+	def dijkstra(self, x = 0, y = 0, layer = 0, targets = ()):
+		return self.aStar(x, y, layer, targets, False)
+
+	def tracePath(self, parents, tile: Tile):
+		# follow the parent pointers back to the start of a search
+		path = []
+		step = parents[tile.relativePosition]
+		while step:
+			tile, direction = step
+			path.append(direction)
+			step = parents[tile.relativePosition]
+		path.reverse()
+		return path
 
 	
 	def print(self):
@@ -214,7 +467,7 @@ class Map:
 			if not self.data[layer] or layer in self.mergedLayers: continue
 			print(f"layer: {layer:3} | " + ' '.join([f"{i+self.origins[layer][0]:4}" for i in range(self.sizes[layer][0])]))
 			print("-----------+-" + 5*self.sizes[layer][0]*'-')
-			print('\n'.join([f"       {i+self.origins[layer][1]:3d} | " +' '.join([f"{str(tile) if tile else "  ? ":>4}" for tile in self.data[layer][i]]) for i in range(self.sizes[layer][1])]))
+			print('\n'.join([f"       {y:3d} | " +' '.join([f"{str(tile) if tile else "  ? ":>4}" for tile in [self.tileAt(x, y, layer) for x in range(self.origins[layer][0], self.origins[layer][0]+self.sizes[layer][0])]]) for y in range(self.origins[layer][1], self.origins[layer][1]+self.sizes[layer][1])]))
 			print("-----------+-" + 5*self.sizes[layer][0]*'-')
 			print()
 		print("landmarks:", list(map(lambda p: (p[0], p[1].relativePosition), self.landmarks.items())))
\ No newline at end of file
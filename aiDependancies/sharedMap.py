@@ -0,0 +1,143 @@
+from multiprocessing import shared_memory
+import contextlib
+import itertools
+import struct
+import weakref
+
+# the shared map is two append-only logs of cells, one written by each agent, so
+# neither has to lock anything or copy the other's map. each log is a chain of
+# segments in shared memory: a segment starts with the number of cells in it and,
+# once it is full, the name of the block the log carries on in. the first block
+# holds the first segment of both logs, every block after that one segment
+COUNT = struct.Struct("<I")
+NEXT = struct.Struct("<32s")  # name of the next segment, empty until there is one
+CELL = struct.Struct("<iicc") # x, y, layer anchor, cell type
+CAPACITY = 1 << 16            # cells each segment can hold
+SEGMENT = COUNT.size + NEXT.size + CAPACITY*CELL.size
+
+# agents in the same process (like vecsim's) don't need the OS to share their
+# map, and a block of shared memory holds file descriptors open for as long as
+# it's attached, which runs out with a big enough batch. blocks made inside
+# inProcess() are plain memory instead, found by name in localBlocks
+localBlocks = {}
+localNames = itertools.count()
+keepLocal = False
+
+class LocalBlock:
+	def __init__(self, size):
+		self.name = f"local_{next(localNames)}"
+		self.buf = memoryview(bytearray(size))
+		localBlocks[self.name] = self
+
+	def close(self):
+		pass
+
+	def unlink(self):
+		localBlocks.pop(self.name, None)
+
+@contextlib.contextmanager
+def inProcess():
+	global keepLocal
+	previous, keepLocal = keepLocal, True
+	try:
+		yield
+	finally:
+		keepLocal = previous
+
+def makeBlock(size):
+	# new blocks are zero filled, so every count and name in them starts empty
+	if keepLocal:
+		return LocalBlock(size)
+	return shared_memory.SharedMemory(create=True, size=size)
+
+def joinBlock(name):
+	if name in localBlocks:
+		return localBlocks[name]
+	return shared_memory.SharedMemory(name)
+
+def releaseBlocks(owned, joined):
+	for block in joined:
+		block.close()
+	for block in owned:
+		block.close()
+		block.unlink()
+
+class SharedMap:
+	def __init__(self, name = None):
+		# make a new block, or join the one another agent made
+		block = makeBlock(2*SEGMENT) if name is None else joinBlock(name)
+		self.name = block.name
+
+		# blocks we made, which we clean up, and ones the other agent made
+		self.owned = [block] if name is None else []
+		self.joined = [] if name is None else [block]
+
+		# whoever made the block writes the first log. each side keeps the
+		# segment it is at in its log as (block, offset)
+		writer = 0 if name is None else 1
+		self.writing = (block, writer*SEGMENT)
+		self.reading = (block, (1 - writer)*SEGMENT)
+		self.written = 0 # cells in the segment we're writing
+		self.read = 0    # cells of the segment we're reading that we've taken in
+
+		self.release = weakref.finalize(self, releaseBlocks, self.owned, self.joined)
+
+	def close(self):
+		self.release()
+
+	def extend(self):
+		# carry our log on in a new segment, and leave its name at the end of the full one
+		block = makeBlock(SEGMENT)
+		self.owned.append(block)
+
+		full, offset = self.writing
+		NEXT.pack_into(full.buf, offset + COUNT.size, block.name.encode('ascii'))
+		self.writing = (block, 0)
+		self.written = 0
+
+	def follow(self):
+		# move on to the next segment of the other log, if it has one yet
+		block, offset = self.reading
+		name = NEXT.unpack_from(block.buf, offset + COUNT.size)[0].rstrip(b'\0')
+		if not name:
+			return False
+		block = joinBlock(name.decode('ascii'))
+		self.joined.append(block)
+		self.reading = (block, 0)
+		self.read = 0
+		return True
+
+	def publish(self, memory):
+		# add the cells that changed in memory since last time to our log
+		for tile in memory.changes:
+			if self.written == CAPACITY:
+				self.extend()
+			block, offset = self.writing
+			x, y, anchor = memory.exportPosition(*tile.relativePosition)
+			CELL.pack_into(block.buf, offset + COUNT.size + NEXT.size + self.written*CELL.size, x, y, anchor.encode('ascii'), tile.type.encode('ascii'))
+			self.written += 1
+
+			# a full segment's count has to be in before the next one is named
+			if self.written == CAPACITY:
+				COUNT.pack_into(block.buf, offset, self.written)
+		memory.changes.clear()
+
+		# the count goes in last, so the other side never reads a half written cell
+		block, offset = self.writing
+		COUNT.pack_into(block.buf, offset, self.written)
+
+	def ingest(self, memory):
+		# take in the cells the other agent has added since last time, read in place
+		ownChanges = len(memory.changes)
+		while True:
+			block, offset = self.reading
+			count = COUNT.unpack_from(block.buf, offset)[0]
+			for i in range(self.read, count):
+				x, y, anchor, cellType = CELL.unpack_from(block.buf, offset + COUNT.size + NEXT.size + i*CELL.size)
+				memory.rememberCell(*memory.importPosition(x, y, anchor.decode('ascii')), cellType.decode('ascii'))
+			self.read = count
+			if count < CAPACITY or not self.follow():
+				break
+
+		# the other agent already knows about these, so don't send them back
+		del memory.changes[ownChanges:]
@@ -36,39 +36,61 @@ transporterPairs = {
 	'p': 'y'
 }
 
+# integer codes for the categories above, tiles store these instead of strings
+categoryNames = ["EMPTY", "WALL", "EXIT", "TRANSPORTER", "GOAL", "UNKNOWN"]
+EMPTY, WALL, EXIT, TRANSPORTER, GOAL, UNKNOWN = range(len(categoryNames))
+categoryCodes = {cellType: categoryNames.index(category) for cellType, category in tileCategories.items()}
+
+# neighbors are stored in a small list, in this order. only transporters have the 'U' slot
+directionNames = ('N', 'S', 'E', 'W', 'U')
+directionIndex = {direction: i for i, direction in enumerate(directionNames)}
+
 class Tile:
+	__slots__ = ("relativePosition", "type", "category", "neighbors")
+
 	def __init__(self, x=0, y=0, cellType='g', layer = 0):
-		self.relativePosition = [x, y, layer] # position in the agent's coordinate system
+		self.relativePosition = (x, y, layer) # position in the agent's coordinate system
 		self.type = cellType                  # character corresponding to the cell type
-		self.relations = {
-			'N': None,
-			'S': None,
-			'E': None,
-			'W': None
-		}
-		self.tileCategory = tileCategories[cellType] or "UNKNOWN"
+		self.category = categoryCodes.get(cellType, UNKNOWN)
+		self.neighbors = [None] * (5 if self.category == TRANSPORTER else 4)
+
+	@property
+	def tileCategory(self):
+		return categoryNames[self.category]
+
+	@property
+	def relations(self):
+		# neighbors by direction, as a new dict (use neighbor/setNeighbor to change them)
+		return dict(zip(directionNames, self.neighbors))
+
+	def setType(self, cellType):
+		# only used for goals turning into floor, which doesn't change the neighbor slots
+		self.type = cellType
+		self.category = categoryCodes.get(cellType, UNKNOWN)
+
+	def hasDirection(self, direction):
+		return directionIndex[direction] < len(self.neighbors)
+
+	def neighbor(self, direction):
+		i = directionIndex[direction]
+		return self.neighbors[i] if i < len(self.neighbors) else None
+
+	def setNeighbor(self, direction, tile):
+		self.neighbors[directionIndex[direction]] = tile
 
-		if self.tileCategory == "TRANSPORTER" and ('U' not in self.relations.keys()):
-			self.relations['U'] = None
+	def neighborItems(self):
+		# (direction, neighbor) pairs, like relations.items() used to give
+		return zip(directionNames, self.neighbors)
 	
 	def hasUnknowns(self):
-		# if self.tileCategory == "TRANSPORTER":
-		# 	# print(self.relations.values())
-		return ( None in self.relations.values() ) and ( self.type != 'w' )
-		# return ( None in self.relations.values() )
+		return ( None in self.neighbors ) and ( self.category != WALL )
 
 	def numUnknowns(self):
 		# tallies unknowns to weight searching
-		count = 0
-		for tile in self.relations.values():
-			if not tile:
-				count += 1
-		return count
+		return self.neighbors.count(None)
 
-	def __del__(self):
-		del self.relations
 	# again, just some code for terminal output
 	def __str__(self):
 		if self.type not in tileCharacters.keys(): return str(self.type)
-		if self.tileCategory in ("EMPTY", "TRANSPORTER"): return "".join(list(map(lambda key: key if self.relations[key] == None else ' ', self.relations.keys())))
+		if self.category in (EMPTY, TRANSPORTER): return "".join([direction if tile == None else ' ' for direction, tile in self.neighborItems()])
 		return tileCharacters[self.type]
@@ -0,0 +1,230 @@
+import os
+import sys
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import world
+import misc
+import sim
+import profiler
+
+# columns of the summary table, in order
+SUMMARY_FIELDS = [
+    "world", "seed", "max_turns", "turns",
+    "stateA", "stateB", "scoreA", "scoreB", "total", "error"
+]
+
+# worlds this worker process has loaded, reset between episodes instead of reloaded
+loaded_worlds = {}
+
+
+def cached_world(world_filename):
+    the_world = loaded_worlds.get(world_filename)
+    if the_world is not None:
+        the_world.reset()
+        return the_world
+
+    if not os.path.isfile(world_filename):
+        raise misc.InvalidWorldException(f"{world_filename} was not found.")
+    the_world = world.World(world_filename)
+    the_world.load_world()
+    if the_world.grid:
+        loaded_worlds[world_filename] = the_world
+    return the_world
+
+
+def run_episode(world_filename, seed, max_turns, turn_deadline=None, profile=False, compiled_filename=None):
+    # runs a single headless episode, this is what each worker process executes.
+    # the world is loaded from its compiled copy if there is one
+    result = {
+        "world": world_filename,
+        "seed": seed,
+        "max_turns": max_turns,
+        "turns": 0,
+        "stateA": "ERROR",
+        "stateB": "ERROR",
+        "pointsA": 0,
+        "pointsB": 0,
+        "scoreA": 0,
+        "scoreB": 0,
+        "total": 0,
+        "error": "",
+        "profile": profiler.Profiler() if profile else None
+    }
+
+    try:
+        the_world = cached_world(compiled_filename or world_filename)
+        result.update(sim.run_sim(
+            the_world, max_turns,
+            turn_deadline=turn_deadline,
+            profile=result["profile"],
+            seed=seed,
+            verbosity=sim.QUIET
+        ))
+    except Exception as e:
+        # one broken world or agent shouldn't take the rest of the sweep with it,
+        # the episode is left in the ERROR state with what went wrong
+        result["error"] = f"{type(e).__name__}: {e}".replace(",", ";")
+        print(f"{world_filename} seed {seed}: {result['error']}")
+
+    return result
+
+
+def run_batch(world_filenames, seeds, turn_limits, workers=None, turn_deadline=None, profile=False):
+    # every combination of world, seed and turn limit is one episode
+    episodes = list(itertools.product(world_filenames, seeds, turn_limits))
+    if not episodes:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+
+    # hand out episodes in chunks so small maps don't drown in ipc overhead
+    chunksize = max(1, len(episodes) // (workers * 4))
+
+    with tempfile.TemporaryDirectory() as compiled_dir, ProcessPoolExecutor(max_workers=workers) as pool:
+        compiled = compile_worlds(world_filenames, compiled_dir)
+        return list(pool.map(
+            run_episode,
+            *zip(*episodes),
+            itertools.repeat(turn_deadline),
+            itertools.repeat(profile),
+            (compiled.get(world_filename) for world_filename, _, _ in episodes),
+            chunksize=chunksize
+        ))
+
+
+def compile_worlds(world_filenames, directory):
+    # parses each text world once and writes it out compiled, so the workers map
+    # the same file instead of every episode parsing the text again. worlds that
+    # don't load are left out, and their episodes fail with the error in their row
+    compiled = {}
+    for i, world_filename in enumerate(dict.fromkeys(world_filenames)):
+        if not os.path.isfile(world_filename):
+            continue
+        the_world = world.World(world_filename)
+        try:
+            the_world.load_world()
+        except (misc.InvalidCellException, misc.InvalidWorldException):
+            continue
+        compiled[world_filename] = os.path.join(directory, f"{i}.mwb")
+        the_world.save_compiled(compiled[world_filename])
+    return compiled
+
+
+def parse_seeds(arg):
+    # accepts "7", "0-99" or "1,5,9"
+    seeds = []
+    for part in arg.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def print_summary(results, out=None):
+    out = out or sys.stdout
+
+    widths = {
+        field: max([len(field)] + [len(str(r[field])) for r in results])
+        for field in SUMMARY_FIELDS
+    }
+    out.write(" ".join(f"{field:>{widths[field]}}" for field in SUMMARY_FIELDS) + "\n")
+    for r in results:
+        out.write(" ".join(f"{r[field]!s:>{widths[field]}}" for field in SUMMARY_FIELDS) + "\n")
+
+    # aggregate over seeds for each world and turn limit
+    out.write("\n")
+    groups = {}
+    for r in results:
+        groups.setdefault((r["world"], r["max_turns"]), []).append(r)
+    for (world_filename, max_turns), group in groups.items():
+        exited = sum(
+            (r["stateA"] == "EXITED") + (r["stateB"] == "EXITED") for r in group
+        )
+        out.write(
+            f"{world_filename} t={max_turns}: {len(group)} episodes, "
+            f"mean total {sum(r['total'] for r in group) / len(group):.1f}, "
+            f"mean turns {sum(r['turns'] for r in group) / len(group):.1f}, "
+            f"{exited}/{2 * len(group)} agents exited\n"
+        )
+
+        # and the profiles of the group as one, if there are any
+        profiles = [r["profile"] for r in group if r["profile"] is not None]
+        if profiles:
+            total = profiler.Profiler()
+            total.episodes = 0
+            for profile in profiles:
+                total.merge(profile)
+            total.report(out)
+            out.write("\n")
+
+
+def write_csv(results, filename):
+    with open(filename, 'w') as f:
+        f.write(",".join(SUMMARY_FIELDS) + "\n")
+        for r in results:
+            f.write(",".join(str(r[field]) for field in SUMMARY_FIELDS) + "\n")
+
+
+def main():
+
+    world_filenames = []
+    seeds = [0]
+    turn_limits = []
+    workers = None
+    csv_filename = None
+    turn_deadline = None
+    profile = False
+
+    args = sys.argv
+
+    if "-h" in args:
+        print(
+            "Usage: batch.py -w WORLD [-w WORLD ...] [-s SEEDS] [-t TURNS ...] [-j WORKERS] [-o CSV] [-p SECONDS] [-P]\n"
+            "  SEEDS may be a single seed, a range (0-99) or a list (1,5,9)\n"
+            "  -p runs each agent in its own process, and times it out if a turn takes longer than SECONDS\n"
+            "  -P profiles the episodes and reports where the time went for each world"
+        )
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filenames.append(args[i+1])
+            elif args[i] == "-s":
+                seeds = parse_seeds(args[i+1])
+            elif args[i] == "-t":
+                turn_limits.append(int(args[i+1]))
+            elif args[i] == "-j":
+                workers = int(args[i+1])
+            elif args[i] == "-o":
+                csv_filename = args[i+1]
+            elif args[i] == "-p":
+                turn_deadline = float(args[i+1])
+            elif args[i] == "-P":
+                profile = True
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    if not world_filenames:
+        print("Map argument missing. Run with -h for help.")
+        return
+
+    results = run_batch(world_filenames, seeds, turn_limits or [400], workers, turn_deadline, profile)
+    print_summary(results)
+
+    if csv_filename is not None:
+        write_csv(results, csv_filename)
+
+
+if __name__ == "__main__":
+    main()
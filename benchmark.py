@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import world
+import misc
+import sim
+import profiler
+import worldgen
+from batch import parse_seeds
+
+# columns of the results, in order
+BENCHMARK_FIELDS = [
+    "world", "size", "episodes", "turns_per_sec",
+    "A_p50_ms", "A_p90_ms", "A_p99_ms",
+    "B_p50_ms", "B_p90_ms", "B_p99_ms",
+    "mean_total"
+]
+
+# worlds that are always benchmarked, whatever else is given
+WORLDS_DIR = "worlds"
+
+
+def benchmark_world(the_world, seeds, max_turns, repeats):
+    # runs every seed on a loaded world in this process, one after another so the
+    # timings don't fight over cores. the fastest of the repeats is the one
+    # reported, the think times come from all of them
+    best_seconds = None
+    profile = profiler.Profiler(keep_samples=True)
+    profile.episodes = 0
+    totals = []
+
+    for repeat in range(repeats):
+        seconds = 0
+        turns = 0
+        totals = []
+        for seed in seeds:
+            # every episode starts from the same world, reset rather than reloaded
+            the_world.reset()
+
+            episode = profiler.Profiler(keep_samples=True)
+            start = time.perf_counter()
+            result = sim.run_sim(the_world, max_turns, profile=episode, seed=seed, verbosity=sim.QUIET)
+            seconds += time.perf_counter() - start
+
+            turns += result["turns"]
+            totals.append(result["total"])
+            profile.merge(episode)
+
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+            best_turns = turns
+
+    def ms(agent, q):
+        seconds = profile.percentile(agent, q)
+        return round(seconds * 1e3, 3) if seconds is not None else ""
+
+    return {
+        "world": the_world.world_filename,
+        "size": f"{the_world.get_width()}x{the_world.get_height()}",
+        "episodes": len(seeds),
+        "turns_per_sec": round(best_turns / best_seconds, 1) if best_seconds else 0,
+        "A_p50_ms": ms(0, 50),
+        "A_p90_ms": ms(0, 90),
+        "A_p99_ms": ms(0, 99),
+        "B_p50_ms": ms(1, 50),
+        "B_p90_ms": ms(1, 90),
+        "B_p99_ms": ms(1, 99),
+        "mean_total": sum(totals) / len(totals)
+    }
+
+
+def print_results(results, out=None):
+    out = out or sys.stdout
+    widths = {
+        field: max([len(field)] + [len(str(r[field])) for r in results])
+        for field in BENCHMARK_FIELDS
+    }
+    out.write(" ".join(f"{field:>{widths[field]}}" for field in BENCHMARK_FIELDS) + "\n")
+    for r in results:
+        out.write(" ".join(f"{r[field]!s:>{widths[field]}}" for field in BENCHMARK_FIELDS) + "\n")
+
+
+def write_csv(results, filename):
+    with open(filename, 'w') as f:
+        f.write(",".join(BENCHMARK_FIELDS) + "\n")
+        for r in results:
+            f.write(",".join(str(r[field]) for field in BENCHMARK_FIELDS) + "\n")
+
+
+def read_csv(filename):
+    with open(filename) as f:
+        fields = f.readline().strip().split(",")
+        return {
+            row["world"]: row
+            for row in (dict(zip(fields, line.strip().split(","))) for line in f if line.strip())
+        }
+
+
+def compare(results, baseline, tolerance, out=None):
+    # checks the results against earlier ones, returns True if nothing regressed.
+    # with seeded agents the scores have to match exactly, the speed only has to
+    # stay within tolerance percent
+    out = out or sys.stdout
+    ok = True
+    benchmarked = {r["world"] for r in results}
+    for name in baseline:
+        if name not in benchmarked:
+            out.write(f"{name}: in baseline but not benchmarked\n")
+            ok = False
+    for r in results:
+        old = baseline.get(r["world"])
+        if old is None:
+            out.write(f"{r['world']}: not in baseline\n")
+            continue
+
+        speed = r["turns_per_sec"] / float(old["turns_per_sec"])
+        out.write(f"{r['world']}: {speed:.2f}x baseline turns/sec")
+        if speed < 1 - tolerance / 100:
+            out.write(" - SLOWER")
+            ok = False
+        if r["mean_total"] != float(old["mean_total"]):
+            out.write(f" - SCORE CHANGED from {old['mean_total']}")
+            ok = False
+        out.write("\n")
+    return ok
+
+
+def main():
+
+    world_filenames = []
+    generated_sizes = []
+    seeds = list(range(10))
+    max_turns = 400
+    repeats = 3
+    csv_filename = None
+    baseline_filename = None
+    tolerance = 10
+
+    args = sys.argv
+
+    if "-h" in args:
+        print(
+            "Usage: benchmark.py [-w WORLD ...] [-g SIZE ...] [-s SEEDS] [-t TURNS] [-r REPEATS] [-o CSV] [-c BASELINE] [-x PERCENT]\n"
+            f"  benchmarks every world in {WORLDS_DIR}/, and any more given\n"
+            "  -w adds a world file\n"
+            "  -g adds a world made by worldgen.py with seed 0, SIZE is WIDTHxHEIGHT or\n"
+            "     one number for a square world, e.g. -g 256 -g 4096\n"
+            "  -c compares with results saved by -o, and fails if a world got more than\n"
+            "     PERCENT (default 10) slower or its score changed"
+        )
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filenames.append(args[i+1])
+            elif args[i] == "-g":
+                generated_sizes.append(worldgen.parse_size(args[i+1]))
+            elif args[i] == "-s":
+                seeds = parse_seeds(args[i+1])
+            elif args[i] == "-t":
+                max_turns = int(args[i+1])
+            elif args[i] == "-r":
+                repeats = int(args[i+1])
+            elif args[i] == "-o":
+                csv_filename = args[i+1]
+            elif args[i] == "-c":
+                baseline_filename = args[i+1]
+            elif args[i] == "-x":
+                tolerance = float(args[i+1])
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    # the bundled worlds stay in, so results can always be compared with a baseline
+    bundled = sorted(os.path.join(WORLDS_DIR, name) for name in os.listdir(WORLDS_DIR))
+    world_filenames = bundled + [
+        filename for filename in world_filenames
+        if os.path.normpath(filename) not in map(os.path.normpath, bundled)
+    ]
+
+    results = []
+    for world_filename in world_filenames:
+        try:
+            the_world = world.World(world_filename)
+            the_world.load_world()
+            results.append(benchmark_world(the_world, seeds, max_turns, repeats))
+        except (misc.InvalidCellException, misc.InvalidWorldException) as e:
+            print(e)
+    for width, height in generated_sizes:
+        try:
+            the_world = worldgen.generate_world(width, height, seed=0)
+            results.append(benchmark_world(the_world, seeds, max_turns, repeats))
+        except misc.InvalidWorldException as e:
+            print(e)
+    print_results(results)
+
+    if csv_filename is not None:
+        write_csv(results, csv_filename)
+
+    if baseline_filename is not None:
+        if not compare(results, read_csv(baseline_filename), tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
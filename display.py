@@ -51,98 +51,134 @@ class Display:
             self.font_size
         )
 
+        # the map is drawn once and then patched, see draw
+        self.background = None
+        self.drawn_grid = None
+        self.redrawn = set() # cells drawn over the background since, see changed_cells
+        self.agent_rects = []
+        self.glyphs = {}
+        self.events = []
+
     def update(self, agent_xA, agent_yA, facingA, agent_xB, agent_yB, facingB):
-        for event in pygame.event.get():
-            pass
+        self.move_agents(agent_xA, agent_yA, facingA, agent_xB, agent_yB, facingB)
+        self.draw()
 
+    def move_agents(self, agent_xA, agent_yA, facingA, agent_xB, agent_yB, facingB):
+        # where to draw the agents next frame
         self.agent_xA = agent_xA
         self.agent_yA = agent_yA
         self.agent_xB = agent_xB
         self.agent_yB = agent_yB
-        self.screen.fill("black")
-        for x in range(0, self.cells_w):
-            for y in range(0, self.cells_h):
-                if self.world.is_valid_cell(x, y):
-                    cell = self.world.get_cell(x, y)
-                    pygame.draw.rect(
-                        self.screen,
-                        self.color_key[cell],
-                        pygame.Rect(
-                            x*self.cell_size,
-                            y*self.cell_size,
-                            x*self.cell_size+self.cell_size,
-                            y*self.cell_size+self.cell_size
-                        )
-                    )
-                    if cell in self.text:
-                        surface, rect = self.font.render(cell)
-                        self.screen.blit(
-                            surface,
-                            (
-                                x*self.cell_size + self.cell_size//2 - rect.w//2,
-                                y*self.cell_size + self.cell_size//2 - rect.h//2
-                            )
-                        )
 
-        if self.agent_xA is not None:
-            cxA = self.agent_xA*self.cell_size + self.cell_size//2
-            cyA = self.agent_yA*self.cell_size + self.cell_size//2
-
-            pygame.draw.circle(
-                self.screen,
-                self.agent_color,
-                (cxA, cyA),
-                self.agent_size
-            )
+    def draw(self):
+        # events are kept for whoever is driving the display, e.g. replays
+        self.events = pygame.event.get()
 
-            surfaceA, rectA = self.font.render('A')
+        # the first frame shows the whole map, after that only what changed is redrawn
+        if self.background is None:
+            self.render_background()
+            self.screen.blit(self.background, (0, 0))
+            dirty = None
+        else:
+            dirty = self.changed_cells()
+            for rect in dirty:
+                self.screen.blit(self.background, rect, rect)
 
-            self.screen.blit(
-                surfaceA,
-                (
-                    cxA-rectA.w//2,
-                    cyA-rectA.h//2
-                )
-            )
-            
+        # put back whatever the agents were covering, then draw them where they are now
+        agents = []
+        if self.agent_xA is not None:
+            agents.append((self.agent_xA, self.agent_yA, 'A'))
         if self.agent_xB is not None:
-            cxB = self.agent_xB*self.cell_size + self.cell_size//2
-            cyB = self.agent_yB*self.cell_size + self.cell_size//2
-        
-            pygame.draw.circle(
-                self.screen,
-                self.agent_color,
-                (cxB, cyB),
-                self.agent_size
-            )
-        
-            surfaceB, rectB = self.font.render('B')
-        
-            self.screen.blit(
-                surfaceB,
+            agents.append((self.agent_xB, self.agent_yB, 'B'))
+
+        if dirty is not None:
+            for rect in self.agent_rects:
+                self.screen.blit(self.background, rect, rect)
+            dirty.extend(self.agent_rects)
+
+        self.agent_rects = []
+        for x, y, name in agents:
+            self.draw_agent(x, y, name)
+            self.agent_rects.append(self.cell_rect(x, y))
+
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            dirty.extend(self.agent_rects)
+            pygame.display.update(dirty)
+
+    def cell_rect(self, x, y):
+        return pygame.Rect(
+            x*self.cell_size,
+            y*self.cell_size,
+            self.cell_size,
+            self.cell_size
+        )
+
+    def glyph(self, text):
+        # rendered text is cached, there are only a handful of characters
+        if text not in self.glyphs:
+            self.glyphs[text] = self.font.render(text)
+        return self.glyphs[text]
+
+    def render_background(self):
+        # the map, without agents, drawn once to a surface of its own
+        self.background = pygame.Surface((self.screen_w, self.screen_h))
+        self.background.fill("black")
+        for x in range(0, self.cells_w):
+            for y in range(0, self.cells_h):
+                if self.world.is_valid_cell(x, y):
+                    self.draw_cell(x, y)
+        self.drawn_grid = bytearray(self.world.grid)
+
+    def draw_cell(self, x, y):
+        cell = self.world.get_cell(x, y)
+        rect = self.cell_rect(x, y)
+        pygame.draw.rect(self.background, self.color_key[cell], rect)
+        if cell in self.text:
+            surface, text_rect = self.glyph(cell)
+            self.background.blit(
+                surface,
                 (
-                    cxB-rectB.w//2,
-                    cyB-rectB.w//2
+                    rect.x + self.cell_size//2 - text_rect.w//2,
+                    rect.y + self.cell_size//2 - text_rect.h//2
                 )
             )
+        return rect
+
+    def changed_cells(self):
+        # cells that changed since they were drawn (goals being picked up),
+        # redrawn onto the background. only cells the world has changed can
+        # differ, and ones drawn before, which a reset may have put back
+        rects = []
+        grid = self.world.grid
+        width = self.world.get_width()
+        for i in self.world.changed | self.redrawn:
+            if grid[i] != self.drawn_grid[i]:
+                rects.append(self.draw_cell(i % width, i // width))
+                self.drawn_grid[i] = grid[i]
+                self.redrawn.add(i)
+        return rects
 
-        # fx = cxA
-        # fy = cyA
-        # match facing:
-        #     case 'N': fy -= self.agent_size
-        #     case 'S': fy += self.agent_size
-        #     case 'E': fx += self.agent_size
-        #     case 'W': fx -= self.agent_size
-
-        # pygame.draw.line(
-        #     self.screen,
-        #     self.agent_facing_color,
-        #     (cx, cy),
-        #     (fx, fy),
-        #     2
-        # )
-
-        pygame.display.flip()
+    def draw_agent(self, x, y, name):
+        cx = x*self.cell_size + self.cell_size//2
+        cy = y*self.cell_size + self.cell_size//2
+
+        pygame.draw.circle(
+            self.screen,
+            self.agent_color,
+            (cx, cy),
+            self.agent_size
+        )
+
+        surface, rect = self.glyph(name)
+        self.screen.blit(
+            surface,
+            (
+                cx-rect.w//2,
+                cy-rect.h//2
+            )
+        )
 
     def quit(self):
         pygame.quit()
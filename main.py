@@ -2,16 +2,25 @@ import sys
 import world
 import misc
 import sim
+import tracefile
+import profiler
 
 def main():
 
     world_filename = None
     log_filename = None
     log = None
+    trace_filename = None
+    trace = None
     max_turns = None
     the_world = None
     use_display = False
     display_speed = 0.5
+    agent_processes = False
+    turn_deadline = None
+    profile = None
+    seed = None
+    verbosity = sim.VERBOSE
 
     args = sys.argv
 
@@ -28,12 +37,29 @@ def main():
                 world_filename = args[i+1]
             elif args[i] == "-l":
                 log_filename = args[i+1]
+            elif args[i] == "-r":
+                trace_filename = args[i+1]
             elif args[i] == "-d":
                 use_display = True
                 try:
                     display_speed = float(args[i+1])
                 except:
                     pass
+            elif args[i] == "-p":
+                agent_processes = True
+                try:
+                    turn_deadline = float(args[i+1])
+                except:
+                    pass
+            elif args[i] == "-P":
+                profile = profiler.Profiler()
+            elif args[i] == "-q":
+                verbosity = sim.SUMMARY
+            elif args[i] == "-s":
+                try:
+                    seed = int(args[i+1])
+                except ValueError:
+                    print(f"seed must be an int: {args[i+1]}")
             elif args[i] == "-t":
                 try:
                     max_turns = int(args[i+1])
@@ -47,16 +73,23 @@ def main():
 
     if log_filename is not None:
         log = open(log_filename, 'w')
+
+    if trace_filename is not None:
+        trace = tracefile.TraceWriter(trace_filename, world_filename)
         
     try:
         the_world = world.World(world_filename)
         the_world.load_world()
-        sim.run_sim(the_world, max_turns, log, use_display, display_speed)
+        sim.run_sim(the_world, max_turns, log, use_display, display_speed, trace, agent_processes, turn_deadline, profile, seed, verbosity)
+        if profile is not None:
+            profile.report()
     except misc.InvalidCellException as e:
         print(e)
     finally:
         if log is not None:
             log.close()
+        if trace is not None:
+            trace.close()
 
 
 
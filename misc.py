@@ -2,4 +2,8 @@
 class InvalidCellException(Exception):
     pass
 class InvalidWorldException(Exception):
+    pass
+class InvalidTraceException(Exception):
+    pass
+class AgentTimeoutException(Exception):
     pass
\ No newline at end of file
@@ -0,0 +1,112 @@
+import sys
+import time
+
+# phases of a turn, in the order they happen. "log" is the agent's percepts
+# and command going to the log, "trace" the outcome of its move going to the
+# log and the trace
+PHASES = ["percepts", "update", "log", "triggers", "trace", "display"]
+AGENT_NAMES = {0: "A", 1: "B", None: "-"}
+
+
+# Collects where an episode's time goes. run_sim calls lap at the end of each
+# phase with the time the phase started, and gets back the time the next one
+# starts. Profiles of several episodes can be merged and reported together.
+class Profiler:
+
+    def __init__(self, keep_samples=False):
+        self.times = {}    # (phase, agent) -> seconds spent
+        self.calls = {}    # (phase, agent) -> number of times the phase ran
+        self.latency = {}  # agent -> {bucket: count} of update times, see bucket
+        self.counters = {} # (name, agent) -> total, e.g. search expansions
+        self.samples = {} if keep_samples else None # agent -> every update time, for percentiles
+        self.turns = 0
+        self.episodes = 1
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, phase, agent, start, end=None):
+        # end is when the phase finished, if that was before now
+        now = time.perf_counter() if end is None else end
+        key = (phase, agent)
+        self.times[key] = self.times.get(key, 0) + now - start
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+        if phase == "update":
+            histogram = self.latency.setdefault(agent, {})
+            b = bucket(now - start)
+            histogram[b] = histogram.get(b, 0) + 1
+            if self.samples is not None:
+                self.samples.setdefault(agent, []).append(now - start)
+        return now
+
+    def count(self, name, agent, n=1):
+        key = (name, agent)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def merge(self, other):
+        for key, seconds in other.times.items():
+            self.times[key] = self.times.get(key, 0) + seconds
+        for key, calls in other.calls.items():
+            self.calls[key] = self.calls.get(key, 0) + calls
+        for agent, histogram in other.latency.items():
+            mine = self.latency.setdefault(agent, {})
+            for b, n in histogram.items():
+                mine[b] = mine.get(b, 0) + n
+        for key, n in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + n
+        if self.samples is not None and other.samples is not None:
+            for agent, samples in other.samples.items():
+                self.samples.setdefault(agent, []).extend(samples)
+        self.turns += other.turns
+        self.episodes += other.episodes
+
+    def percentile(self, agent, q):
+        # an agent's update time that q percent of updates were at least as quick
+        # as, only available when samples are kept
+        samples = sorted(self.samples.get(agent, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def report(self, out=None):
+        out = out or sys.stdout
+        total = sum(self.times.values()) or 1
+
+        out.write(f"profile of {self.episodes} episode(s), {self.turns} turns\n")
+        out.write(f"{'phase':>9} {'agent':>5} {'calls':>8} {'total ms':>10} {'mean us':>9} {'share':>6}\n")
+        for phase in PHASES:
+            for agent in (0, 1, None):
+                key = (phase, agent)
+                if key not in self.times:
+                    continue
+                seconds = self.times[key]
+                calls = self.calls[key]
+                out.write(
+                    f"{phase:>9} {AGENT_NAMES[agent]:>5} {calls:>8} "
+                    f"{seconds * 1e3:>10.1f} {seconds / calls * 1e6:>9.1f} "
+                    f"{seconds / total:>6.1%}\n"
+                )
+
+        for (name, agent), n in sorted(self.counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            out.write(f"{name} ({AGENT_NAMES[agent]}): {n}\n")
+
+        for agent, histogram in sorted(self.latency.items(), key=lambda item: str(item[0])):
+            out.write(f"update latency ({AGENT_NAMES[agent]}):\n")
+            for b in range(min(histogram), max(histogram) + 1):
+                out.write(f"  {bucket_label(b):>10} {histogram.get(b, 0):>8}\n")
+
+
+def bucket(seconds):
+    # latencies are bucketed by powers of two microseconds
+    return int(seconds * 1e6).bit_length()
+
+
+def bucket_label(b):
+    # the upper bound of a bucket
+    us = 1 << b
+    if us < 1000:
+        return f"<{us}us"
+    if us < 1000000:
+        return f"<{us / 1000:g}ms"
+    return f"<{us / 1000000:g}s"
@@ -0,0 +1,183 @@
+import sys
+import world
+import misc
+import tracefile
+
+HELP = """Usage: replay.py TRACE [-w WORLD] [-s TURN] [-f TURNS_PER_SECOND]
+  Plays back a trace recorded with main.py -r, without running the AIs.
+
+  space        play / pause
+  left, right  step back / forward a turn
+  up, down     play faster / slower
+  home, end    jump to the start / end
+  click, drag  scrub through the episode (left of the window is the start)"""
+
+
+def load_frames(filename, the_world):
+    # where both agents are at the end of every turn, frame 0 being the start,
+    # and the turn each goal was picked up on
+    frames = [(the_world.get_startxyA(), the_world.get_startxyB())]
+    goal_turns = {}
+    for record in tracefile.read_trace(filename):
+        while len(frames) <= record.turn:
+            frames.append(list(frames[-1]))
+
+        end = (record.end_x, record.end_y) if record.end_x != -1 else None
+        frames[record.turn][record.agent] = end
+
+        if record.trigger == "GOAL_TRIGGERED":
+            goal_turns.setdefault(record.trigger_cell, record.turn)
+
+    return frames, goal_turns
+
+
+class Replay:
+
+    def __init__(self, the_world, frames, goal_turns, turns_per_second=4):
+        import display
+
+        self.world = the_world
+        self.frames = frames
+        self.turns_per_second = turns_per_second
+        self.playing = False
+        self.turn = 0
+
+        # where each goal was, so picking it up can be undone when seeking back
+        self.goals = [
+            (turn, goal, list(the_world.landmarks[goal]))
+            for goal, turn in goal_turns.items()
+        ]
+
+        (xA, yA), (xB, yB) = frames[0]
+        self.disp = display.Display(the_world, xA, yA, xB, yB)
+
+    @property
+    def last_turn(self):
+        return len(self.frames) - 1
+
+    def seek(self, turn):
+        # jump straight to the end of a turn, only the goals need touching
+        self.turn = max(0, min(turn, self.last_turn))
+        for goal_turn, goal, positions in self.goals:
+            cell = 'g' if goal_turn <= self.turn else goal
+            for x, y in positions:
+                self.world.set_cell(x, y, cell)
+
+        a, b = self.frames[self.turn]
+        self.disp.move_agents(*(a or (None, None)), None, *(b or (None, None)), None)
+
+    def handle_events(self, events):
+        # returns False once the window is closed
+        import pygame
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                return False
+            elif event.type == pygame.KEYDOWN:
+                match event.key:
+                    case pygame.K_SPACE:
+                        self.playing = not self.playing
+                    case pygame.K_RIGHT:
+                        self.playing = False
+                        self.seek(self.turn + 1)
+                    case pygame.K_LEFT:
+                        self.playing = False
+                        self.seek(self.turn - 1)
+                    case pygame.K_UP:
+                        self.turns_per_second *= 2
+                    case pygame.K_DOWN:
+                        self.turns_per_second /= 2
+                    case pygame.K_HOME:
+                        self.seek(0)
+                    case pygame.K_END:
+                        self.seek(self.last_turn)
+                    case pygame.K_ESCAPE | pygame.K_q:
+                        return False
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION) and pygame.mouse.get_pressed()[0]:
+                self.playing = False
+                self.seek(round(event.pos[0] / self.disp.screen_w * self.last_turn))
+        return True
+
+    def run(self, start_turn=0):
+        import pygame
+
+        clock = pygame.time.Clock()
+        progress = 0.0
+        self.seek(start_turn)
+
+        while True:
+            self.disp.draw()
+            if not self.handle_events(self.disp.events):
+                break
+            pygame.display.set_caption(
+                f"turn {self.turn}/{self.last_turn}"
+                f"{'' if self.playing else ' (paused)'} - {self.turns_per_second:g} turns/s"
+            )
+
+            # turns go by at their own pace, independent of the frame rate
+            seconds = clock.tick(60) / 1000
+            if self.playing:
+                progress += seconds * self.turns_per_second
+                if progress >= 1:
+                    self.seek(self.turn + int(progress))
+                    progress -= int(progress)
+                    if self.turn == self.last_turn:
+                        self.playing = False
+            else:
+                progress = 0.0
+
+        self.disp.quit()
+
+
+def main():
+
+    trace_filename = None
+    world_filename = None
+    start_turn = 0
+    turns_per_second = 4
+
+    args = sys.argv
+
+    if "-h" in args or len(args) < 2:
+        print(HELP)
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filename = args[i+1]
+                i += 1
+            elif args[i] == "-s":
+                start_turn = int(args[i+1])
+                i += 1
+            elif args[i] == "-f":
+                turns_per_second = float(args[i+1])
+                i += 1
+            else:
+                trace_filename = args[i]
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    try:
+        # the world is the one the trace was recorded on, unless told otherwise
+        world_filename = world_filename or tracefile.read_world_filename(trace_filename)
+        the_world = world.World(world_filename)
+        the_world.load_world()
+
+        frames, goal_turns = load_frames(trace_filename, the_world)
+        Replay(the_world, frames, goal_turns, turns_per_second).run(start_turn)
+    except (misc.InvalidCellException, misc.InvalidWorldException, misc.InvalidTraceException) as e:
+        print(e)
+    except FileNotFoundError as e:
+        print(f"{e.filename} was not found.")
+
+
+if __name__ == "__main__":
+    main()
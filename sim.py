@@ -1,8 +1,9 @@
 import world
+import misc
 import aiA
 import aiB
-import display
-import time
+import asyncio
+import random
 
 DIRECTIONS = {
     "N": (0, -1),
@@ -20,338 +21,565 @@ VALID_COMMANDS = [
     'U' # Teleport/Open Door/Touch Goal
 ]
 
+# how much an episode writes to its log. below VERBOSE the per turn messages
+# aren't even put together, SUMMARY leaves just the final score
+VERBOSE = 2
+SUMMARY = 1
+QUIET = 0
+
 
 def run_sim(
     the_world, 
     max_turns=None, 
     log=None, 
     use_display=False,
-    display_speed=0.5
+    display_speed=0.5,
+    trace=None,
+    agent_processes=False,
+    turn_deadline=None,
+    profile=None,
+    seed=None,
+    verbosity=VERBOSE
+):
+    # runs an episode to the end on an event loop of its own
+    return asyncio.run(run_sim_async(
+        the_world,
+        max_turns,
+        log,
+        use_display,
+        display_speed,
+        trace,
+        agent_processes,
+        turn_deadline,
+        profile=profile,
+        seed=seed,
+        verbosity=verbosity
+    ))
+
+
+async def run_sim_async(
+    the_world, 
+    max_turns=None, 
+    log=None, 
+    use_display=False,
+    display_speed=0.5,
+    trace=None,
+    agent_processes=False,
+    turn_deadline=None,
+    display_fps=30,
+    profile=None,
+    seed=None,
+    verbosity=VERBOSE
 ):
+    # the simulation itself. agent updates and the wait between turns are awaited,
+    # so other episodes on the same event loop get to run in the meantime.
+    # if a profiler.Profiler is given, the time spent in each phase of a turn is
+    # added to it. a seed makes the agents' choices repeatable. verbosity is
+    # one of VERBOSE, SUMMARY and QUIET
+    verbose = verbosity >= VERBOSE
 
     POINTS_PER_GOAL = 0
     if max_turns is not None:
         POINTS_PER_GOAL = max_turns
     
-    the_aiA = aiA.AI(max_turns)
-    the_aiB = aiB.AI(max_turns)
-
-    agent_xA, agent_yA = the_world.get_startxyA()
-    agent_xB, agent_yB = the_world.get_startxyB()
-    agent_facingA = the_world.get_start_face_dirA()
-    agent_facingB = the_world.get_start_face_dirB()
-    cells_visited = []
-    turn = 1
-    agent_cmdA = "X"
-    agent_cmdB = "X"
-    msgA = None
-    msgB = None
-    perceptsA = {}
-    perceptsB = {}
-    pointsA = 0
-    pointsB = 0
-    aiA_state = 'GOOD'
-    aiB_state = 'GOOD'
-
+    # each agent gets a seed of its own, drawn from the episode's
+    seedA, seedB = None, None
+    if seed is not None:
+        seeds = random.Random(seed)
+        seedA, seedB = seeds.getrandbits(64), seeds.getrandbits(64)
+
+    # whatever happens to the episode, the agents and the display are let go of
+    the_aiA = the_aiB = None
     disp = None
-
-    if use_display:
-        import display
-        disp = display.Display(
-            the_world,
-            agent_xA,
-            agent_yA,
-            agent_xB,
-            agent_yB
-        )
-
-    if use_display:
-        disp.update(
-            agent_xA,
-            agent_yA,
-            agent_facingA,
-            agent_xB,
-            agent_yB,
-            agent_facingB
-        )
-        time.sleep(display_speed)
-
-    
-
-    run = True
-    while run:
-
-        
-        if aiA_state != 'GOOD' and aiB_state != 'GOOD':
-            run = False
-            write_to_log(
-                log,
-                f"-----Scenario finished-----"
-            )
-            write_to_log(
-                log,
-                f"FINAL AGENT STATES:\nAgent A {aiA_state}\nAgent B {aiB_state}"
-            )
-            continue
+    refresh = None
+    try:
+        # a deadline can only be enforced on agents in their own processes
+        agent_processes = agent_processes or turn_deadline is not None
+        if agent_processes:
+            import agentproc
+            the_aiA = agentproc.AgentProcess(aiA.AI, max_turns, turn_deadline, seedA)
+            the_aiB = agentproc.AgentProcess(aiB.AI, max_turns, turn_deadline, seedB)
         else:
-            write_to_log(
-                log,
-                f"-----Turn {turn}-----"
-            )
-        
-        if aiA_state == 'GOOD':
-            pointsA += 1
-            
-            # What does the agent see?
-            perceptsA = get_percepts(the_world, agent_xA, agent_yA, agent_facingA)
-            
-            # Get agent's command
-            agent_cmdA, msgA = the_aiA.update(perceptsA, msgB)
-            
-            # LOG ###############################################################
-            
-            write_to_log(
-                log,
-                f"Agent A"
-            )
-            write_to_log(
-                log,
-                f"   Start:    {agent_xA},{agent_yA}"
-            )
-            percept_str = ""
-            for k, v in perceptsA.items():
-                percept_str += f"({k} {v}) "
-            write_to_log(
-                log,
-                f"   Percepts: {percept_str}"
-            )
-            write_to_log(
-                log,
-                f"   Command:  {agent_cmdA}"
-            )
+            the_aiA = new_agent(aiA.AI, max_turns, seedA)
+            the_aiB = new_agent(aiB.AI, max_turns, seedB)
+
+        agent_xA, agent_yA = the_world.get_startxyA()
+        agent_xB, agent_yB = the_world.get_startxyB()
+        agent_facingA = the_world.get_start_face_dirA()
+        agent_facingB = the_world.get_start_face_dirB()
+        cells_visited = []
+        turn = 1
+        agent_cmdA = "X"
+        agent_cmdB = "X"
+        msgA = None
+        msgB = None
+        perceptsA = {}
+        perceptsB = {}
+        pointsA = 0
+        pointsB = 0
+        aiA_state = 'GOOD'
+        aiB_state = 'GOOD'
+        turns_played = 0
 
-            # ####################################################################
+        if use_display:
+            import display
+            disp = display.Display(
+                the_world,
+                agent_xA,
+                agent_yA,
+                agent_xB,
+                agent_yB
+            )
 
-            # Move the agent
-            if validate_agent_cmd(agent_cmdA):
+            # the display redraws on its own clock, whatever pace the turns go at
+            refresh = asyncio.create_task(refresh_display(disp, display_fps, profile))
 
-                new_agent_x = agent_xA
-                new_agent_y = agent_yA
+        if use_display:
+            disp.move_agents(
+                agent_xA,
+                agent_yA,
+                agent_facingA,
+                agent_xB,
+                agent_yB,
+                agent_facingB
+            )
+            await asyncio.sleep(display_speed)
 
-                match agent_cmdA:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdA]
-                        new_agent_x = agent_xA + dx
-                        new_agent_y = agent_yA + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xA = new_agent_x
-                            agent_yA = new_agent_y
+        
 
+        run = True
+        while run:
 
-                trigger = the_world.check_triggers(agent_xA, agent_yA, agent_cmdA)
-                match trigger[0]:
-                    case "EXIT":
+            
+            if aiA_state != 'GOOD' and aiB_state != 'GOOD':
+                run = False
+                if verbose:
+                    write_to_log(
+                        log,
+                        f"-----Scenario finished-----"
+                    )
+                    write_to_log(
+                        log,
+                        f"FINAL AGENT STATES:\nAgent A {aiA_state}\nAgent B {aiB_state}"
+                    )
+                continue
+            elif verbose:
+                write_to_log(
+                    log,
+                    f"-----Turn {turn}-----"
+                )
+            
+            if aiA_state == 'GOOD':
+                pointsA += 1
+                
+                if profile is not None: phase_start = profile.start()
+
+                # What does the agent see?
+                perceptsA = get_percepts(the_world, agent_xA, agent_yA, agent_facingA)
+                if profile is not None: phase_start = profile.lap("percepts", 0, phase_start)
+                
+                # Get agent's command
+                try:
+                    agent_cmdA, msgA = await update_agent(the_aiA, perceptsA, msgB, profile, 0)
+                except misc.AgentTimeoutException:
+                    agent_cmdA, msgA = "TIMEOUT", None
+                if profile is not None: phase_start = profile.start()
+                startA = (agent_xA, agent_yA)
+                
+                # LOG ###############################################################
+                
+                if verbose:
+                    write_to_log(
+                        log,
+                        f"Agent A"
+                    )
+                    write_to_log(
+                        log,
+                        f"   Start:    {agent_xA},{agent_yA}"
+                    )
+                    percept_str = ""
+                    for k, v in perceptsA.items():
+                        percept_str += f"({k} {v}) "
+                    write_to_log(
+                        log,
+                        f"   Percepts: {percept_str}"
+                    )
+                    write_to_log(
+                        log,
+                        f"   Command:  {agent_cmdA}"
+                    )
+                if profile is not None: phase_start = profile.lap("log", 0, phase_start)
+
+                # ####################################################################
+
+                # Move the agent
+                if validate_agent_cmd(agent_cmdA):
+
+                    new_agent_x = agent_xA
+                    new_agent_y = agent_yA
+
+                    match agent_cmdA:
+                        case 'N' | 'E' | 'S' | 'W':
+                            dx, dy = DIRECTIONS[agent_cmdA]
+                            new_agent_x = agent_xA + dx
+                            new_agent_y = agent_yA + dy
+                            if the_world.is_cell_enterable(new_agent_x, new_agent_y):
+                                agent_xA = new_agent_x
+                                agent_yA = new_agent_y
+
+
+                    trigger = the_world.check_triggers(agent_xA, agent_yA, agent_cmdA)
+                    if profile is not None: phase_start = profile.lap("triggers", 0, phase_start)
+                    match trigger[0]:
+                        case "EXIT":
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent A has left the environment."
+                                )
+                            aiA_state = 'EXITED'
+                            agent_xA = None
+                            agent_yA = None
+                            agent_facingA = None
+                        case "TELEPORT":
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent A teleported from {the_world.get_cell(agent_xA, agent_yA)} to {the_world.get_cell(trigger[1], trigger[2])}"
+                                )
+                            agent_xA = trigger[1]
+                            agent_yA = trigger[2]
+
+                        case "GOAL_TRIGGERED":
+                            # if trigger[1] == 0:
+                            #     write_to_log(
+                            #         log,
+                            #         f"   Trigger:  Agent A activated goal {trigger[2]}"
+                            #     )
+                            #     write_to_log(
+                            #         log,
+                            #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
+                            #     )
+                            #     run = False
+                            # else:
+                            pointsA += POINTS_PER_GOAL
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent A activated goal {trigger[2]}"
+                                )
+                        case "NONE":
+                            pass
+
+
+                    if verbose:
                         write_to_log(
                             log,
-                            f"   Trigger:  Agent A has left the environment."
+                            f"   End:      {agent_xA},{agent_yA}"
                         )
-                        aiA_state = 'EXITED'
-                        agent_xA = None
-                        agent_yA = None
-                        agent_facingA = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent A teleported from {the_world.get_cell(agent_xA, agent_yA)} to {the_world.get_cell(trigger[1], trigger[2])}"
+
+                    if trace is not None:
+                        trace.record(
+                            turn, 0, agent_cmdA, trigger[0],
+                            startA, (agent_xA, agent_yA),
+                            get_trigger_cell(the_world, trigger),
+                            perceptsA
+                        )
+
+                elif agent_cmdA == "TIMEOUT":
+                    if verbose:
+                        write_to_log(log, "Agent A ran out of time - FAILURE")
+                    if trace is not None:
+                        trace.record(
+                            turn, 0, "?", "TIMEOUT",
+                            startA, startA, None, perceptsA
                         )
-                        agent_xA = trigger[1]
-                        agent_yA = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent A activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsA += POINTS_PER_GOAL
+                    aiA_state = 'TIMEOUT'
+
+                else:
+                    if verbose:
+                        write_to_log(log, f"Agent A invalid command: {agent_cmdA}")
+                        write_to_log(log, "Agent A - FAILURE")
+                    if trace is not None:
+                        trace.record(
+                            turn, 0, agent_cmdA, "INVALID",
+                            startA, startA, None, perceptsA
+                        )
+                    aiA_state = 'BAD'
+                if profile is not None: phase_start = profile.lap("trace", 0, phase_start)
+
+            if aiB_state == 'GOOD':
+                pointsB += 1
+                
+                if profile is not None: phase_start = profile.start()
+
+                # What does the agent see?
+                perceptsB = get_percepts(the_world, agent_xB, agent_yB, agent_facingB)
+                if profile is not None: phase_start = profile.lap("percepts", 1, phase_start)
+
+                # Get agent's command
+                try:
+                    agent_cmdB, msgB = await update_agent(the_aiB, perceptsB, msgA, profile, 1)
+                except misc.AgentTimeoutException:
+                    agent_cmdB, msgB = "TIMEOUT", None
+                if profile is not None: phase_start = profile.start()
+                startB = (agent_xB, agent_yB)
+
+                # LOG ###############################################################
+                if verbose:
+                    write_to_log(
+                        log,
+                        f"Agent B"
+                    )
+                    write_to_log(
+                        log,
+                        f"   Start:    {agent_xB},{agent_yB}"
+                    )
+                    percept_str = ""
+                    for k, v in perceptsB.items():
+                        percept_str += f"({k} {v}) "
+                    write_to_log(
+                        log,
+                        f"   Percepts: {percept_str}"
+                    )
+                    write_to_log(
+                        log,
+                        f"   Command:  {agent_cmdB}"
+                    )
+                if profile is not None: phase_start = profile.lap("log", 1, phase_start)
+
+                # ####################################################################
+
+                # Move the agent
+                if validate_agent_cmd(agent_cmdB):
+
+                    new_agent_x = agent_xB
+                    new_agent_y = agent_yB
+
+                    match agent_cmdB:
+                        case 'N' | 'E' | 'S' | 'W':
+                            dx, dy = DIRECTIONS[agent_cmdB]
+                            new_agent_x = agent_xB + dx
+                            new_agent_y = agent_yB + dy
+                            if the_world.is_cell_enterable(new_agent_x, new_agent_y):
+                                agent_xB = new_agent_x
+                                agent_yB = new_agent_y
+
+
+                    trigger = the_world.check_triggers(agent_xB, agent_yB, agent_cmdB)
+                    if profile is not None: phase_start = profile.lap("triggers", 1, phase_start)
+                    match trigger[0]:
+                        case "EXIT":
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent B has left the environment."
+                                )
+                            aiB_state = 'EXITED'
+                            agent_xB = None
+                            agent_yB = None
+                            agent_facingB = None
+                        case "TELEPORT":
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent B teleported from {the_world.get_cell(agent_xB, agent_yB)} to {the_world.get_cell(trigger[1], trigger[2])}"
+                                )
+                            agent_xB = trigger[1]
+                            agent_yB = trigger[2]
+
+                        case "GOAL_TRIGGERED":
+                            # if trigger[1] == 0:
+                            #     write_to_log(
+                            #         log,
+                            #         f"   Trigger:  Agent B activated goal {trigger[2]}"
+                            #     )
+                            #     write_to_log(
+                            #         log,
+                            #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
+                            #     )
+                            #     run = False
+                            # else:
+                            pointsB += POINTS_PER_GOAL
+                            if verbose:
+                                write_to_log(
+                                    log,
+                                    f"   Trigger:  Agent B activated goal {trigger[2]}"
+                                )
+                        case "NONE":
+                            pass
+
+
+                    if verbose:
                         write_to_log(
                             log,
-                            f"   Trigger:  Agent A activated goal {trigger[2]}"
+                            f"   End:      {agent_xB},{agent_yB}"
                         )
-                    case "NONE":
-                        pass
 
+                    if trace is not None:
+                        trace.record(
+                            turn, 1, agent_cmdB, trigger[0],
+                            startB, (agent_xB, agent_yB),
+                            get_trigger_cell(the_world, trigger),
+                            perceptsB
+                        )
 
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xA},{agent_yA}"
-                )
 
-            else:
-                write_to_log(log, f"Agent A invalid command: {agent_cmdA}")
-                write_to_log(log, "Agent A - FAILURE")
-                aiA_state = 'BAD'
+                elif agent_cmdB == "TIMEOUT":
+                    if verbose:
+                        write_to_log(log, "Agent B ran out of time - FAILURE")
+                    if trace is not None:
+                        trace.record(
+                            turn, 1, "?", "TIMEOUT",
+                            startB, startB, None, perceptsB
+                        )
+                    aiB_state = 'TIMEOUT'
+
+                else:
+                    if verbose:
+                        write_to_log(log, f"Agent B invalid command: {agent_cmdB}")
+                        write_to_log(log, "Agent B - FAILURE")
+                    if trace is not None:
+                        trace.record(
+                            turn, 1, agent_cmdB, "INVALID",
+                            startB, startB, None, perceptsB
+                        )
+                    aiB_state = 'BAD'
+                if profile is not None: phase_start = profile.lap("trace", 1, phase_start)
+
+            turns_played = turn
+
+            if use_display:
+                disp.move_agents(
+                    agent_xA,
+                    agent_yA,
+                    agent_facingA,
+                    agent_xB,
+                    agent_yB,
+                    agent_facingB
+                )
+                await asyncio.sleep(display_speed)
 
-        if aiB_state == 'GOOD':
-            pointsB += 1
-            
-            # What does the agent see?
-            perceptsB = get_percepts(the_world, agent_xB, agent_yB, agent_facingB)
+            if max_turns is not None:
+                if turn >= max_turns:
+                    if verbose:
+                        write_to_log(
+                            log,
+                            f"---MAX TURNS REACHED---"
+                        )
+                    run = False
+                    continue
+                
+            turn += 1
 
-            # Get agent's command
-            agent_cmdB, msgB = the_aiB.update(perceptsB, msgA)
 
-            # LOG ###############################################################
+        A_points_scored = pointsA if aiA_state == 'EXITED' else 0
+        B_points_scored = pointsB if aiB_state == 'EXITED' else 0
+            
+        if verbosity >= SUMMARY:
             write_to_log(
                 log,
-                f"Agent B"
+                f"\nFINAL SCORE"
             )
             write_to_log(
                 log,
-                f"   Start:    {agent_xB},{agent_yB}"
+                f"Agent A received {pointsA} points and scored {A_points_scored} points."
             )
-            percept_str = ""
-            for k, v in perceptsB.items():
-                percept_str += f"({k} {v}) "
             write_to_log(
                 log,
-                f"   Percepts: {percept_str}"
+                f"Agent B received {pointsB} points and scored {B_points_scored} points."
             )
             write_to_log(
                 log,
-                f"   Command:  {agent_cmdB}"
+                f"TOTAL: {A_points_scored + B_points_scored}"
             )
-
-            # ####################################################################
-
-            # Move the agent
-            if validate_agent_cmd(agent_cmdB):
-
-                new_agent_x = agent_xB
-                new_agent_y = agent_yB
-
-                match agent_cmdB:
-                    case 'N' | 'E' | 'S' | 'W':
-                        dx, dy = DIRECTIONS[agent_cmdB]
-                        new_agent_x = agent_xB + dx
-                        new_agent_y = agent_yB + dy
-                        if the_world.is_cell_enterable(new_agent_x, new_agent_y):
-                            agent_xB = new_agent_x
-                            agent_yB = new_agent_y
-
-
-                trigger = the_world.check_triggers(agent_xB, agent_yB, agent_cmdB)
-                match trigger[0]:
-                    case "EXIT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B has left the environment."
-                        )
-                        aiB_state = 'EXITED'
-                        agent_xB = None
-                        agent_yB = None
-                        agent_facingB = None
-                    case "TELEPORT":
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B teleported from {the_world.get_cell(agent_xB, agent_yB)} to {the_world.get_cell(trigger[1], trigger[2])}"
-                        )
-                        agent_xB = trigger[1]
-                        agent_yB = trigger[2]
-
-                    case "GOAL_TRIGGERED":
-                        # if trigger[1] == 0:
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        #     )
-                        #     write_to_log(
-                        #         log,
-                        #         f"   Trigger:  Your team has completed this map in {turn} turns. SUCCESS"
-                        #     )
-                        #     run = False
-                        # else:
-                        pointsB += POINTS_PER_GOAL
-                        write_to_log(
-                            log,
-                            f"   Trigger:  Agent B activated goal {trigger[2]}"
-                        )
-                    case "NONE":
-                        pass
-
-
-                write_to_log(
-                    log,
-                    f"   End:      {agent_xB},{agent_yB}"
-                )
-
-
-            else:
-                write_to_log(log, f"Agent B invalid command: {agent_cmdB}")
-                write_to_log(log, "Agent B - FAILURE")
-                aiB_state = 'BAD'
             
-
         if use_display:
-            disp.update(
-                agent_xA,
-                agent_yA,
-                agent_facingA,
-                agent_xB,
-                agent_yB,
-                agent_facingB
-            )
-            time.sleep(display_speed)
+            refresh.cancel()
+            disp.draw()
+
+        if profile is not None:
+            profile.turns += turns_played
+            for name, n in agent_stats(the_aiA).items():
+                profile.count(name, 0, n)
+            for name, n in agent_stats(the_aiB).items():
+                profile.count(name, 1, n)
+
+        # summary of the episode, so callers (e.g. batch runs) don't have to parse the log
+        return {
+            "turns": turns_played,
+            "stateA": aiA_state,
+            "stateB": aiB_state,
+            "pointsA": pointsA,
+            "pointsB": pointsB,
+            "scoreA": A_points_scored,
+            "scoreB": B_points_scored,
+            "total": A_points_scored + B_points_scored
+        }
+    finally:
+        if refresh is not None:
+            refresh.cancel()
+        if disp is not None:
+            disp.quit()
+        if the_aiA is not None:
+            close_agent(the_aiA)
+        if the_aiB is not None:
+            close_agent(the_aiB)
+
+def new_agent(ai_class, max_turns, seed=None):
+    # the seed is only passed when there is one, so agents written from the
+    # template, which only take max_turns, still run unseeded
+    if seed is None:
+        return ai_class(max_turns)
+    return ai_class(max_turns, seed)
+
+def close_agent(ai):
+    # agents written from the template have nothing to let go of
+    close = getattr(ai, "close", None)
+    if close is not None:
+        close()
+
+def agent_stats(ai):
+    # an agent's profiling counters, if it keeps any
+    stats = getattr(ai, "stats", None)
+    return stats() if stats is not None else {}
+
+async def update_agent(ai, percepts, msg, profile=None, agent=None):
+    # only the agent's own thinking is timed as its update, not whatever else
+    # on the loop gets to run while we wait on it or yield after it
+    if profile is not None: start = profile.start()
+
+    # agents in their own processes can be waited on without blocking
+    if hasattr(ai, "update_async"):
+        try:
+            return await ai.update_async(percepts, msg)
+        finally:
+            if profile is not None: profile.lap("update", agent, start, ai.answered)
+
+    # an agent in this process blocks while it thinks, so let everything
+    # else on the loop have a go once it's done
+    try:
+        result = ai.update(percepts, msg)
+    finally:
+        if profile is not None: profile.lap("update", agent, start)
+    await asyncio.sleep(0)
+    return result
+
+
+async def refresh_display(disp, fps, profile=None):
+    while True:
+        if profile is not None: phase_start = profile.start()
+        disp.draw()
+        if profile is not None: profile.lap("display", None, phase_start)
+        await asyncio.sleep(1 / fps)
 
-        if max_turns is not None:
-            if turn >= max_turns:
-                write_to_log(
-                    log,
-                    f"---MAX TURNS REACHED---"
-                )
-                run = False
-                continue
-            
-        turn += 1
-
-
-    A_points_scored = pointsA if aiA_state == 'EXITED' else 0
-    B_points_scored = pointsB if aiB_state == 'EXITED' else 0
-        
-    write_to_log(
-        log,
-        f"\nFINAL SCORE"
-    )
-    write_to_log(
-        log,
-        f"Agent A received {pointsA} points and scored {A_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"Agent B received {pointsB} points and scored {B_points_scored} points."
-    )
-    write_to_log(
-        log,
-        f"TOTAL: {A_points_scored + B_points_scored}"
-    )
-        
-    if use_display:
-        disp.quit()
 
 def get_percepts(the_world, agent_x, agent_y, agent_facing):
     # percepts = the_world.get_cells_around(agent_x, agent_y)
     percepts = {'X':[the_world.get_cell(agent_x, agent_y)]}
     for d, v in DIRECTIONS.items():
         dx, dy = v
-        ray = the_world.raycast(agent_x, agent_y, dx, dy)
-        ray = the_world.prune_raycast(ray)
-        percepts[d] = ray
+        percepts[d] = the_world.sightline(agent_x, agent_y, dx, dy)
 
     # percepts = [the_world.get_cell(agent_x, agent_y)]
     # dx, dy = DIRECTIONS[agent_facing]
@@ -365,13 +593,21 @@ def get_percepts(the_world, agent_x, agent_y, agent_facing):
     return percepts
 
 
+def get_trigger_cell(the_world, trigger):
+    # the cell a trigger involved, for traces
+    match trigger[0]:
+        case "TELEPORT":
+            return the_world.get_cell(trigger[1], trigger[2])
+        case "GOAL_TRIGGERED":
+            return trigger[2]
+    return None
+
 def validate_agent_cmd(cmd):
     return cmd in VALID_COMMANDS
 
 def write_to_log(log, msg):
     if log is not None:
         log.write(f"{msg}\n")
-        log.flush()
     else:
         print(msg)
 
@@ -0,0 +1,81 @@
+import math
+import unittest
+import worldgen
+import sim
+from aiDependancies.map import Map
+from aiDependancies.distanceField import DistanceField
+
+
+class MergeDuringRayTest(unittest.TestCase):
+
+    def test_cell_on_merged_layer(self):
+        memory = Map()
+        for x in range(4):
+            memory.rememberCell(x, 0, 0, 'g')
+
+        # a transporter puts its pair on a layer of its own, until the pair is
+        # seen on the first layer too and the two are merged
+        memory.rememberCell(4, 0, 0, 'b')
+        layer = memory.landmarks['o'].relativePosition[2]
+        memory.rememberCell(1, 0, layer, 'g')
+        memory.rememberCell(0, 2, 0, 'o')
+        self.assertNotEqual(memory.findLayer(layer)[0], layer)
+
+        # the rest of a ray that was started on the old layer
+        memory.rememberCell(2, 0, layer, 'w')
+        tile = memory.tileAt(2, 0, layer)
+        self.assertIsNotNone(tile)
+        self.assertEqual(tile.type, 'w')
+
+    def test_generated_world_with_shared_start(self):
+        # a whole episode on a generated world with both transporter pairs, so
+        # layers get made and merged while the agents share what they've seen
+        # the fixed seeds always play out the same, both agents getting out with
+        # B picking up 5 goals on the way
+        the_world = worldgen.generate_world(48, 48, seed=2, transporters=2, goals=5)
+        for seed in range(3):
+            the_world.reset()
+            result = sim.run_sim(the_world, 400, seed=seed, verbosity=sim.QUIET)
+            self.assertEqual(result["stateA"], "EXITED")
+            self.assertEqual(result["stateB"], "EXITED")
+            self.assertEqual((result["scoreA"], result["scoreB"]), (400, 2400))
+
+
+class DistanceFieldTest(unittest.TestCase):
+
+    def test_removed_transporter(self):
+        # a goal only reachable through a transporter
+        memory = Map()
+        for x in range(4):
+            memory.rememberCell(x, 0, 0, 'g')
+        memory.rememberCell(4, 0, 0, 'b')
+        layer = memory.landmarks['o'].relativePosition[2]
+        memory.rememberCell(1, 0, layer, 'g')
+        memory.rememberCell(2, 0, layer, '3')
+        self.assertEqual(memory.distanceTo('3', 0, 0, 0), 7)
+
+        # once the transporter is gone there's no way there, which the cached
+        # field has to notice rather than repair around
+        memory.rememberCell(4, 0, 0, 'g')
+        self.assertEqual(memory.distanceTo('3', 0, 0, 0), math.inf)
+
+        rebuilt = DistanceField(memory, '3')
+        rebuilt.sync()
+        self.assertEqual(memory.distanceField('3').distances, rebuilt.distances)
+
+    def test_picked_up_goal(self):
+        # a goal that has been picked up doesn't keep a field around to update
+        memory = Map()
+        for x in range(3):
+            memory.rememberCell(x, 0, 0, 'g')
+        memory.rememberCell(3, 0, 0, '5')
+        self.assertEqual(memory.distanceTo('5', 0, 0, 0), 3)
+
+        memory.rememberCell(3, 0, 0, 'g')
+        self.assertNotIn('5', memory.distanceFields)
+        memory.rememberCell(0, 1, 0, 'g')
+        self.assertNotIn('5', memory.distanceFields)
+
+
+if __name__ == "__main__":
+    unittest.main()
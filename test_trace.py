@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+import misc
+import sim
+import tracefile
+import worldgen
+
+
+class TraceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.filename = os.path.join(self.dir.name, "run.mwtr")
+        self.percepts = {'X': ['g'], 'N': ['g', 'w'], 'S': [], 'E': ['r'], 'W': ['w']}
+
+    def test_round_trip(self):
+        with tracefile.TraceWriter(self.filename, "worlds/world2") as trace:
+            trace.record(0, 0, 'N', "NONE", (1, 2), (1, 1), None, self.percepts)
+            trace.record(0, 1, 'U', "GOAL_TRIGGERED", (3, 3), (3, 3), 'r', self.percepts)
+            trace.record(1, 0, 'U', "EXIT", (1, 1), (None, None), None, self.percepts)
+
+        self.assertEqual(tracefile.read_world_filename(self.filename), "worlds/world2")
+        records = list(tracefile.read_trace(self.filename))
+        digest = tracefile.percept_digest(self.percepts)
+        self.assertEqual(records, [
+            tracefile.TraceRecord(0, 0, 'N', "NONE", 1, 2, 1, 1, None, digest),
+            tracefile.TraceRecord(0, 1, 'U', "GOAL_TRIGGERED", 3, 3, 3, 3, 'r', digest),
+            # an agent that has left has no end position
+            tracefile.TraceRecord(1, 0, 'U', "EXIT", 1, 1, -1, -1, None, digest)
+        ])
+
+    def test_bad_command(self):
+        # anything that isn't a one letter command is kept as '?'
+        with tracefile.TraceWriter(self.filename) as trace:
+            trace.record(0, 0, "JUMP", "INVALID", (1, 1), (1, 1), None, self.percepts)
+            trace.record(0, 1, None, "INVALID", (2, 2), (2, 2), None, self.percepts)
+
+        self.assertEqual(tracefile.read_world_filename(self.filename), "")
+        self.assertEqual([r.command for r in tracefile.read_trace(self.filename)], ['?', '?'])
+
+    def test_digest(self):
+        # percepts differing in any direction give different digests
+        changed = dict(self.percepts, S=['w'])
+        self.assertNotEqual(tracefile.percept_digest(changed), tracefile.percept_digest(self.percepts))
+
+    def test_buffered(self):
+        # more records than fit in one buffer all make it to the file, in order
+        count = tracefile.BUFFER_SIZE // tracefile.RECORD.size * 2 + 1
+        with tracefile.TraceWriter(self.filename) as trace:
+            for turn in range(count):
+                trace.record(turn, 0, 'N', "NONE", (0, 0), (0, 0), None, self.percepts)
+
+        self.assertEqual([r.turn for r in tracefile.read_trace(self.filename)], list(range(count)))
+        self.assertEqual(list(tracefile.read_trace_array(self.filename)["turn"]), list(range(count)))
+
+    def test_wrong_version(self):
+        with open(self.filename, 'wb') as f:
+            f.write(tracefile.HEADER.pack(tracefile.MAGIC, tracefile.VERSION + 1, tracefile.RECORD.size, 0))
+        with self.assertRaises(misc.InvalidTraceException):
+            tracefile.read_world_filename(self.filename)
+
+    def test_episode(self):
+        # one record per agent per turn until it leaves, the last being its exit
+        the_world = worldgen.generate_world(48, 48, seed=2, transporters=2, goals=5)
+        with tracefile.TraceWriter(self.filename) as trace:
+            result = sim.run_sim(the_world, 400, trace=trace, seed=0, verbosity=sim.QUIET)
+
+        records = tracefile.read_trace_array(self.filename)
+        for agent, state in ((0, result["stateA"]), (1, result["stateB"])):
+            turns = records[records["agent"] == agent]
+            self.assertEqual(state, "EXITED")
+            self.assertEqual(list(turns["turn"]), list(range(1, len(turns) + 1)))
+            self.assertEqual(turns["trigger"][-1], tracefile.TRIGGER_CODES["EXIT"])
+            self.assertEqual((turns["end_x"][-1], turns["end_y"][-1]), (-1, -1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import struct
+import tempfile
+import unittest
+import misc
+import world
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_row(self):
+        self.assertEqual(world.parse_row(b"w g 0 r\n"), b"wg0r")
+
+    def test_row_with_odd_spacing(self):
+        # anything but single spaces goes the slow way, to the same result
+        self.assertEqual(world.parse_row(b"w  g\t0 r"), b"wg0r")
+
+    def test_row_with_bad_cell(self):
+        with self.assertRaises(misc.InvalidCellException):
+            world.parse_row(b"w g x r")
+
+    def test_world(self):
+        the_world = world.World(os.path.join("worlds", "world_test"))
+        the_world.load_world()
+        self.assertEqual((the_world.width, the_world.height), (8, 5))
+        self.assertEqual(the_world.get_startxyA(), (1, 1))
+        self.assertEqual(the_world.get_start_face_dirB(), 'E')
+        self.assertEqual(the_world.get_cell(3, 1), '0')
+        self.assertEqual(the_world.landmarks['r'], {(6, 3)})
+
+
+class CompiledTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.text = world.World(os.path.join("worlds", "world2"))
+        self.text.load_world()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def load(self, filename):
+        the_world = world.World(filename)
+        the_world.load_world()
+        return the_world
+
+    def test_round_trip(self):
+        self.text.save_compiled(self.path("world2.mwb"))
+        compiled = self.load(self.path("world2.mwb"))
+        self.assertEqual(compiled.grid, self.text.grid)
+        self.assertEqual(bytes(compiled.base), bytes(self.text.grid))
+        self.assertEqual(compiled.landmarks, self.text.landmarks)
+        for attribute in ("width", "height", "start_xA", "start_yA", "start_xB", "start_yB", "face_dirA", "face_dirB"):
+            self.assertEqual(getattr(compiled, attribute), getattr(self.text, attribute))
+
+        # and back out as text
+        compiled.save_text(self.path("world2.txt"))
+        self.assertEqual(self.load(self.path("world2.txt")).grid, self.text.grid)
+
+    def test_base_is_read_only(self):
+        self.text.save_compiled(self.path("world2.mwb"))
+        compiled = self.load(self.path("world2.mwb"))
+        with self.assertRaises(TypeError):
+            compiled.base[0] = 0
+
+    def test_truncated(self):
+        self.text.save_compiled(self.path("world2.mwb"))
+        with open(self.path("world2.mwb"), 'rb') as f:
+            data = f.read()
+        for size in (world.COMPILED_HEADER.size - 1, len(data) - 1):
+            with open(self.path("short.mwb"), 'wb') as f:
+                f.write(data[:size])
+            with self.assertRaises(misc.InvalidWorldException):
+                self.load(self.path("short.mwb"))
+
+    def test_wrong_version(self):
+        self.text.save_compiled(self.path("world2.mwb"))
+        with open(self.path("world2.mwb"), 'r+b') as f:
+            f.seek(len(world.COMPILED_MAGIC))
+            f.write(struct.pack("<H", world.COMPILED_VERSION + 1))
+        with self.assertRaises(misc.InvalidWorldException):
+            self.load(self.path("world2.mwb"))
+
+    def test_bad_cell(self):
+        self.text.save_compiled(self.path("world2.mwb"))
+        with open(self.path("world2.mwb"), 'r+b') as f:
+            f.seek(world.COMPILED_HEADER.size)
+            f.write(b"x")
+        with self.assertRaises(misc.InvalidWorldException):
+            self.load(self.path("world2.mwb"))
+
+
+class ResetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = world.World(os.path.join("worlds", "world2"))
+        self.world.load_world()
+        self.world.index_walls()
+        self.goals = sorted(
+            (cell, min(positions)) for cell, positions in self.world.landmarks.items()
+            if cell in world.World.GOAL_CELLS and positions
+        )
+
+    def state(self):
+        w = self.world
+        return (
+            bytes(w.grid), list(w.goals), w.doors_closed,
+            {cell: set(positions) for cell, positions in w.landmarks.items()},
+            [list(walls) for walls in w.row_walls], [list(walls) for walls in w.col_walls]
+        )
+
+    def pick_up(self, goals):
+        for cell, (x, y) in goals:
+            self.world.set_cell(x, y, 'g')
+            if cell in self.world.goals:
+                self.world.goals.remove(cell)
+
+    def test_reset(self):
+        loaded = self.state()
+        self.pick_up(self.goals[:2])
+        self.world.set_cell(1, 1, 'w')
+        self.world.doors_closed = False
+        self.assertNotEqual(self.state(), loaded)
+
+        self.world.reset()
+        self.assertEqual(self.state(), loaded)
+        self.assertEqual(self.world.changed, set())
+
+    def test_restore(self):
+        self.pick_up(self.goals[:1])
+        self.world.set_cell(1, 1, 'w')
+        snapshot = self.world.snapshot()
+        taken = self.state()
+
+        # only what differs from the loaded world is kept
+        self.assertEqual(len(snapshot["cells"]), 2)
+
+        self.pick_up(self.goals[1:])
+        self.world.set_cell(1, 1, 'g')
+        self.world.restore(snapshot)
+        self.assertEqual(self.state(), taken)
+
+    def test_cell_changed_back(self):
+        # a cell changed and put back isn't part of the snapshot
+        x, y = self.goals[0][1]
+        self.world.set_cell(x, y, 'g')
+        self.world.set_cell(x, y, self.goals[0][0])
+        self.assertEqual(self.world.snapshot()["cells"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
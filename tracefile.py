@@ -0,0 +1,129 @@
+import struct
+import zlib
+import misc
+from collections import namedtuple
+
+# file layout: header, world filename, then fixed-width records
+MAGIC = b"MWTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHHH") # magic, version, record size, filename length
+
+# one record per agent per turn
+RECORD = struct.Struct("<IBcBiiiicI")
+RECORD_FIELDS = [
+    "turn",
+    "agent",        # 0 for A, 1 for B
+    "command",
+    "trigger",      # index into TRIGGERS
+    "start_x",
+    "start_y",
+    "end_x",        # -1 once the agent has left the environment
+    "end_y",
+    "trigger_cell", # goal used, or the cell teleported to
+    "percepts"      # crc32 digest of the percepts
+]
+TraceRecord = namedtuple("TraceRecord", RECORD_FIELDS)
+
+TRIGGERS = ["NONE", "EXIT", "TELEPORT", "GOAL_TRIGGERED", "INVALID", "TIMEOUT"]
+TRIGGER_CODES = {trigger: i for i, trigger in enumerate(TRIGGERS)}
+
+# records are collected in memory and written out in blocks of this size
+BUFFER_SIZE = 1 << 16
+
+
+def percept_digest(percepts):
+    return zlib.crc32("|".join("".join(v) for v in percepts.values()).encode('ascii'))
+
+
+class TraceWriter:
+    def __init__(self, filename, world_filename=""):
+        self.file = open(filename, 'wb')
+        self.buffer = bytearray()
+
+        name = (world_filename or "").encode('utf-8')
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, len(name)))
+        self.file.write(name)
+
+    def record(self, turn, agent, command, trigger, start, end, trigger_cell, percepts):
+        if not (isinstance(command, str) and len(command) == 1):
+            command = "?"
+        end_x, end_y = end if end[0] is not None else (-1, -1)
+
+        self.buffer += RECORD.pack(
+            turn,
+            agent,
+            command.encode('ascii', 'replace'),
+            TRIGGER_CODES[trigger],
+            start[0],
+            start[1],
+            end_x,
+            end_y,
+            (trigger_cell or " ").encode('ascii'),
+            percept_digest(percepts)
+        )
+
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_header(f):
+    magic, version, record_size, name_length = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise misc.InvalidTraceException(f"{f.name} is not a version {VERSION} trace.")
+    return f.read(name_length).decode('utf-8')
+
+
+def read_world_filename(filename):
+    with open(filename, 'rb') as f:
+        return read_header(f)
+
+
+def read_trace(filename):
+    # streams the records back as TraceRecords, with the byte fields decoded
+    with open(filename, 'rb') as f:
+        read_header(f)
+        while True:
+            block = f.read(RECORD.size * 4096)
+            if not block:
+                break
+            for fields in RECORD.iter_unpack(block):
+                record = TraceRecord(*fields)
+                yield record._replace(
+                    command=record.command.decode('ascii'),
+                    trigger=TRIGGERS[record.trigger],
+                    trigger_cell=record.trigger_cell.decode('ascii').strip() or None
+                )
+
+
+def read_trace_array(filename):
+    # the whole trace as a numpy structured array, one row per record
+    import numpy
+    dtype = numpy.dtype([
+        ("turn", "<u4"),
+        ("agent", "u1"),
+        ("command", "S1"),
+        ("trigger", "u1"),
+        ("start_x", "<i4"),
+        ("start_y", "<i4"),
+        ("end_x", "<i4"),
+        ("end_y", "<i4"),
+        ("trigger_cell", "S1"),
+        ("percepts", "<u4")
+    ])
+    with open(filename, 'rb') as f:
+        read_header(f)
+        return numpy.fromfile(f, dtype=dtype)
@@ -0,0 +1,203 @@
+import numpy
+import random
+import aiA
+import aiB
+import world
+import sim
+from aiDependancies import sharedMap
+
+# agent states, stored as small ints so they can live in an array
+GOOD, EXITED, BAD = 0, 1, 2
+STATE_NAMES = ['GOOD', 'EXITED', 'BAD']
+
+# commands are indexed by their position in sim.VALID_COMMANDS
+COMMAND_INDEX = {cmd: i for i, cmd in enumerate(sim.VALID_COMMANDS)}
+USE = COMMAND_INDEX['U']
+COMMAND_DX = numpy.array([sim.DIRECTIONS.get(cmd, (0, 0))[0] for cmd in sim.VALID_COMMANDS])
+COMMAND_DY = numpy.array([sim.DIRECTIONS.get(cmd, (0, 0))[1] for cmd in sim.VALID_COMMANDS])
+
+# lookup tables over cell codes
+WALL_LUT = numpy.frombuffer(world.World.WALL_MASK, dtype=numpy.uint8).astype(bool)
+GOAL_LUT = numpy.frombuffer(world.cell_mask(world.World.GOAL_CELLS), dtype=numpy.uint8).astype(bool)
+EXIT_CODE = world.World.CELL_CODES['r']
+FLOOR_CODE = world.World.CELL_CODES['g']
+TRANSPORTER_PAIRS = {'b': 'o', 'o': 'b', 'y': 'p', 'p': 'y'}
+
+
+# Steps many episodes of the same world in lockstep. The grids of all episodes
+# are stacked into one (episodes, height, width) array, and the moves, wall
+# checks and triggers of every episode are applied together. The AIs are still
+# called once per episode per turn.
+class BatchSim:
+
+    def __init__(self, the_world, episodes, max_turns=None, ai_classes=(aiA.AI, aiB.AI), seed=None):
+        self.world = the_world
+        self.episodes = episodes
+        self.max_turns = max_turns
+        self.points_per_goal = max_turns if max_turns is not None else 0
+
+        n = episodes
+        self.grids = numpy.repeat(the_world.as_array()[None], n, axis=0)
+        self.views = [memoryview(grid) for grid in self.grids.reshape(n, -1)]
+        self.sight_slices = {}
+
+        # agents are indexed [agent, episode], A is 0 and B is 1. with a seed,
+        # every agent gets one of its own drawn from it
+        seeds = random.Random(seed) if seed is not None else None
+        self.ais = [
+            [sim.new_agent(ai_class, max_turns, seeds.getrandbits(64) if seeds else None) for e in range(n)]
+            for ai_class in ai_classes
+        ]
+        self.msgs = [[None] * n, [None] * n]
+        start = [the_world.get_startxyA(), the_world.get_startxyB()]
+        self.xs = numpy.array([[start[0][0]] * n, [start[1][0]] * n])
+        self.ys = numpy.array([[start[0][1]] * n, [start[1][1]] * n])
+        self.states = numpy.full((2, n), GOOD, dtype=numpy.int8)
+        self.points = numpy.zeros((2, n), dtype=numpy.int64)
+        self.turns = numpy.zeros(n, dtype=numpy.int64)
+        self.turn = 1
+
+        # transporters never change, so their destinations can be looked up once
+        self.teleport_x = numpy.full(256, -1)
+        self.teleport_y = numpy.full(256, -1)
+        for cell, other in TRANSPORTER_PAIRS.items():
+            destination = the_world.find_cell(other)
+            if destination is not None:
+                self.teleport_x[world.World.CELL_CODES[cell]] = destination[0]
+                self.teleport_y[world.World.CELL_CODES[cell]] = destination[1]
+
+        # goal positions, so a pickup only touches the cells of that goal
+        self.goal_positions = {}
+        for cell in world.World.GOAL_CELLS:
+            positions = the_world.landmarks[cell]
+            if positions:
+                self.goal_positions[world.World.CELL_CODES[cell]] = (
+                    numpy.array([p[0] for p in positions]),
+                    numpy.array([p[1] for p in positions])
+                )
+
+    def get_percepts(self, e, x, y):
+        # the walls are shared by every episode, so the ray bounds for a cell
+        # are worked out once and only the contents come from this episode
+        i = y*self.world.width + x
+        rays = self.sight_slices.get(i)
+        if rays is None:
+            rays = [
+                (d, self.world.sight_slice(x, y, dx, dy))
+                for d, (dx, dy) in sim.DIRECTIONS.items()
+            ]
+            self.sight_slices[i] = rays
+
+        grid = self.views[e]
+        percepts = {'X': [chr(grid[i])]}
+        for d, ray in rays:
+            percepts[d] = list(grid[ray].tobytes().decode('ascii'))
+        return percepts
+
+    def step_agent(self, agent):
+        other = 1 - agent
+        active = numpy.flatnonzero(self.states[agent] == GOOD)
+        if active.size == 0:
+            return
+
+        self.points[agent, active] += 1
+
+        # ask every active agent for its command. both agents of an episode are
+        # in this process, so the map they share is kept in plain memory
+        commands = numpy.empty(active.size, dtype=numpy.int64)
+        with sharedMap.inProcess():
+            for i, e in enumerate(active):
+                x = int(self.xs[agent, e])
+                y = int(self.ys[agent, e])
+                cmd, self.msgs[agent][e] = self.ais[agent][e].update(
+                    self.get_percepts(e, x, y),
+                    self.msgs[other][e]
+                )
+                commands[i] = COMMAND_INDEX.get(cmd, -1)
+
+        # invalid commands end the agent
+        valid = commands >= 0
+        self.states[agent, active[~valid]] = BAD
+        active = active[valid]
+        commands = commands[valid]
+
+        # move everyone that doesn't walk into a wall or off the map
+        xs = self.xs[agent, active] + COMMAND_DX[commands]
+        ys = self.ys[agent, active] + COMMAND_DY[commands]
+        moved = (xs >= 0) & (xs < self.world.width) & (ys >= 0) & (ys < self.world.height)
+        moved[moved] = ~WALL_LUT[self.grids[active[moved], ys[moved], xs[moved]]]
+        self.xs[agent, active[moved]] = xs[moved]
+        self.ys[agent, active[moved]] = ys[moved]
+
+        # resolve triggers
+        used = commands == USE
+        xs = self.xs[agent, active]
+        ys = self.ys[agent, active]
+        cells = self.grids[active, ys, xs]
+
+        exited = used & (cells == EXIT_CODE)
+        self.states[agent, active[exited]] = EXITED
+
+        teleported = used & (self.teleport_x[cells] >= 0)
+        self.xs[agent, active[teleported]] = self.teleport_x[cells[teleported]]
+        self.ys[agent, active[teleported]] = self.teleport_y[cells[teleported]]
+
+        scored = used & GOAL_LUT[cells]
+        self.points[agent, active[scored]] += self.points_per_goal
+        for code in numpy.unique(cells[scored]):
+            episodes = active[scored][cells[scored] == code]
+            goal_xs, goal_ys = self.goal_positions[code]
+            self.grids[episodes[:, None], goal_ys[None, :], goal_xs[None, :]] = FLOOR_CODE
+
+    def step(self):
+        # returns False once every episode is finished
+        running = (self.states == GOOD).any(axis=0)
+        if not running.any():
+            return False
+        if self.max_turns is not None and self.turn > self.max_turns:
+            return False
+
+        # A moves before B, as in run_sim
+        self.step_agent(0)
+        self.step_agent(1)
+        self.turns[running] = self.turn
+        self.turn += 1
+
+        # let go of the maps of episodes that just finished
+        for e in numpy.flatnonzero(running & ~(self.states == GOOD).any(axis=0)):
+            self.close_episode(e)
+        return True
+
+    def close_episode(self, e):
+        for ais in self.ais:
+            sim.close_agent(ais[e])
+
+    def run(self):
+        while self.step():
+            pass
+        for e in range(self.episodes):
+            self.close_episode(e)
+        return self.results()
+
+    def results(self):
+        # the same summaries run_sim returns, one per episode
+        results = []
+        for e in range(self.episodes):
+            stateA, stateB = self.states[0, e], self.states[1, e]
+            scoreA = int(self.points[0, e]) if stateA == EXITED else 0
+            scoreB = int(self.points[1, e]) if stateB == EXITED else 0
+            results.append({
+                "turns": int(self.turns[e]),
+                "stateA": STATE_NAMES[stateA],
+                "stateB": STATE_NAMES[stateB],
+                "pointsA": int(self.points[0, e]),
+                "pointsB": int(self.points[1, e]),
+                "scoreA": scoreA,
+                "scoreB": scoreB,
+                "total": scoreA + scoreB
+            })
+        return results
+
+
+def run_batch_sim(the_world, episodes, max_turns=None, ai_classes=(aiA.AI, aiB.AI), seed=None):
+    return BatchSim(the_world, episodes, max_turns, ai_classes, seed).run()
@@ -1,5 +1,40 @@
+import os
+import sys
+import mmap
+import struct
+import bisect
 import misc
 
+# compiled worlds are this header followed by the grid, one byte per cell
+COMPILED_MAGIC = b"MWBW"
+COMPILED_VERSION = 1
+COMPILED_HEADER = struct.Struct("<4sHIIiiiicc") # magic, version, width, height, start xA yA xB yB, facings
+
+
+def cell_mask(cells):
+    # lookup table indexed by cell code, 1 for every cell in cells
+    return bytes(chr(code) in cells for code in range(256))
+
+
+def parse_row(line):
+    # a row is its cells separated by single spaces, so the cells are every other
+    # byte and validating them is one table lookup each (translate drops every
+    # valid cell and leaves the rest). anything else, or a row with a bad cell,
+    # goes through the old token by token check so the error is the same
+    line = line.strip()
+    cells = line[::2]
+    if line[1::2] == b" " * (len(cells) - 1) and not cells.translate(None, World.VALID_CODES):
+        return cells
+
+    tokens = line.decode('utf-8', 'replace').split()
+    for element in tokens:
+        if element not in World.VALID_CELLS:
+            raise misc.InvalidCellException(
+                f"{element} is not a valid cell type."
+            )
+    return "".join(tokens).encode('ascii')
+
+
 class World:
 
     VALID_CELLS = [
@@ -16,8 +51,19 @@ class World:
     # Goal Cells
     GOAL_CELLS = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
 
+    # Cells whose positions are indexed, everything except floor and walls
+    LANDMARK_CELLS = [cell for cell in VALID_CELLS if cell not in ('g', 'w')]
+
     DIRECTIONS = ['N', 'E', 'S', 'W']
 
+    # Cells are stored by their ascii code, one byte each, so a run of the grid
+    # can be decoded straight back into cell characters.
+    CELL_CODES = {cell: ord(cell) for cell in VALID_CELLS}
+    VALID_CODES = "".join(VALID_CELLS).encode('ascii')
+
+    # Precomputed masks over cell codes
+    WALL_MASK = cell_mask(WALL_CELLS)
+
     def __init__(self, world_filename):
         self.world_filename = world_filename
         self.start_xA = None
@@ -28,68 +74,199 @@ class World:
         self.face_dirB = None
         self.width = 0
         self.height = 0
-        self.world_map = []
+        self.grid = bytearray() # flat row-major grid of cell codes
+        self.landmarks = {}     # landmark cell -> set of (x, y) positions
+        self.row_walls = None   # sorted wall x's for each row, built on demand
+        self.col_walls = None   # sorted wall y's for each column, built on demand
         self.doors_closed = True
         self.goals = []
+        # the grid as loaded, which resets and snapshots work from. for a compiled
+        # world it's the mapped file, shared with every process that loads it, for
+        # text and generated worlds a second byte per cell
+        self.base = None
+        self.base_goals = []    # and its goals
+        self.changed = set()    # indices of cells that may differ from the base
 
     def load_world(self):
+        self.base = None
         try:
-            with open(self.world_filename, 'r') as f:
+            with open(self.world_filename, 'rb') as f:
+                if f.read(len(COMPILED_MAGIC)) == COMPILED_MAGIC:
+                    self.load_compiled(f)
+                else:
+                    f.seek(0)
+                    self.load_text(f)
 
-                # Parse agent starting location
-                startxy = f.readline().strip().split()
-                facedir = f.readline().strip().split()
-                
-                if len(startxy) != 4:
-                    raise misc.InvalidWorldException(
-                        f"World {self.world_filename} is missing the xy agent start."
-                    )
-
-                try:
-                    if facedir[0] in World.DIRECTIONS:
-                        self.face_dirA = facedir[0]
-                    else:
-                        raise Exception
-                    if facedir[1] in World.DIRECTIONS:
-                        self.face_dirB = facedir[1]
-                    else:
-                        raise Exception
-                except Exception:
-                    raise misc.InvalidWorldException(
-                        f"World {self.world_filename} has an invalid starting facing."
-                    )
-
-                try:
-                    self.start_xA = int(startxy[0])
-                    self.start_yA = int(startxy[1])
-                    self.start_xB = int(startxy[2])
-                    self.start_yB = int(startxy[3])
-                except Exception:
-                    raise misc.InvalidWorldException(
-                        f"Invalid agent starting cells: A: {startxy[0]} {startxy[1]} B: {startxy[2]} {startxy[3]}"
-                    )
-
-                # Parse the world
-                for line in f:
-                    line = line.split()
-                    row = []
-                    for element in line:
-                        if element not in World.VALID_CELLS:
-                            raise misc.InvalidCellException(
-                                f"{element} is not a valid cell type."
-                            )
-                        row.append(element)
-                    self.world_map.append(row)
-
-                self.height = len(self.world_map)
-                self.width = len(self.world_map[0])
-
-                # Find all the goals
-                self.find_goals()
+                self.index_world()
 
         except FileNotFoundError:
             print(f"{self.world_filename} was not found.")
 
+    def index_world(self):
+        # everything derived from a freshly filled in grid
+
+        # Index the landmarks
+        self.index_landmarks()
+
+        # Find all the goals
+        self.goals = []
+        self.find_goals()
+
+        # a compiled world's loader has already left its base, mapped from the file
+        if self.base is None:
+            self.base = bytes(self.grid)
+        self.base_goals = list(self.goals)
+        self.changed = set()
+
+    def load_text(self, f):
+        # Parse agent starting location
+        startxy = f.readline().decode('utf-8', 'replace').strip().split()
+        facedir = f.readline().decode('utf-8', 'replace').strip().split()
+
+        if len(startxy) != 4:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} is missing the xy agent start."
+            )
+
+        try:
+            if facedir[0] in World.DIRECTIONS:
+                self.face_dirA = facedir[0]
+            else:
+                raise Exception
+            if facedir[1] in World.DIRECTIONS:
+                self.face_dirB = facedir[1]
+            else:
+                raise Exception
+        except Exception:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} has an invalid starting facing."
+            )
+
+        try:
+            self.start_xA = int(startxy[0])
+            self.start_yA = int(startxy[1])
+            self.start_xB = int(startxy[2])
+            self.start_yB = int(startxy[3])
+        except Exception:
+            raise misc.InvalidWorldException(
+                f"Invalid agent starting cells: A: {startxy[0]} {startxy[1]} B: {startxy[2]} {startxy[3]}"
+            )
+
+        # Parse the world
+        rows = []
+        for line in f.read().splitlines():
+            row = parse_row(line)
+            if row:
+                rows.append(row)
+
+        self.height = len(rows)
+        self.width = len(rows[0])
+
+        for row in rows:
+            if len(row) != self.width:
+                raise misc.InvalidWorldException(
+                    f"World {self.world_filename} is not rectangular."
+                )
+
+        self.grid = bytearray(b"".join(rows))
+
+    def load_compiled(self, f):
+        # the file is mapped read-only and kept as the world's base, so batch
+        # workers loading the same compiled world share its pages. only the
+        # grid episodes change is copied out of it
+        if os.fstat(f.fileno()).st_size < COMPILED_HEADER.size:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} is truncated."
+            )
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (_, version, self.width, self.height,
+         self.start_xA, self.start_yA, self.start_xB, self.start_yB,
+         face_dirA, face_dirB) = COMPILED_HEADER.unpack_from(mapping)
+
+        if version != COMPILED_VERSION:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} was compiled as version {version}, expected {COMPILED_VERSION}."
+            )
+        if len(mapping) != COMPILED_HEADER.size + self.width * self.height:
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} is truncated."
+            )
+
+        self.face_dirA = face_dirA.decode('ascii')
+        self.face_dirB = face_dirB.decode('ascii')
+        self.base = memoryview(mapping)[COMPILED_HEADER.size:]
+        self.grid = bytearray(self.base)
+
+        # compiled worlds were checked when they were written, this is only a
+        # guard against files that were edited since
+        if self.grid.translate(None, World.VALID_CODES):
+            raise misc.InvalidWorldException(
+                f"World {self.world_filename} has invalid cells."
+            )
+
+    def save_text(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(f"{self.start_xA} {self.start_yA} {self.start_xB} {self.start_yB}\n".encode('ascii'))
+            f.write(f"{self.face_dirA} {self.face_dirB}\n".encode('ascii'))
+
+            # the cells of a row go in the even bytes, spaces in the odd ones
+            line = bytearray(b" " * (2*self.width - 1) + b"\n")
+            for y in range(self.height):
+                line[0:-1:2] = self.grid[y*self.width:(y+1)*self.width]
+                f.write(line)
+
+    def save_compiled(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(COMPILED_HEADER.pack(
+                COMPILED_MAGIC, COMPILED_VERSION, self.width, self.height,
+                self.start_xA, self.start_yA, self.start_xB, self.start_yB,
+                self.face_dirA.encode('ascii'), self.face_dirB.encode('ascii')
+            ))
+            f.write(self.grid)
+
+    def reset(self):
+        # puts the world back the way it was loaded, only touching the cells that
+        # changed, so episodes can share one loaded world however big it is
+        for i in list(self.changed):
+            self.set_cell(i % self.width, i // self.width, chr(self.base[i]))
+        self.changed.clear()
+        self.goals = list(self.base_goals)
+        self.doors_closed = True
+
+    def snapshot(self):
+        # the state of the world as the cells that differ from the base, so taking
+        # one costs as much as the episode has changed, not the size of the map
+        return {
+            "cells": {i: self.grid[i] for i in self.changed if self.grid[i] != self.base[i]},
+            "goals": list(self.goals),
+            "doors_closed": self.doors_closed
+        }
+
+    def restore(self, snapshot):
+        # puts the world back the way it was when the snapshot was taken, which
+        # has to have been of this world since it was last loaded
+        self.reset()
+        for i, code in snapshot["cells"].items():
+            self.set_cell(i % self.width, i // self.width, chr(code))
+        self.goals = list(snapshot["goals"])
+        self.doors_closed = snapshot["doors_closed"]
+
+    @property
+    def world_map(self):
+        # nested list view of the grid, rebuilt on every access
+        return [
+            list(self.grid[y*self.width:(y+1)*self.width].decode('ascii'))
+            for y in range(self.height)
+        ]
+
+    def as_array(self):
+        # numpy is optional, so only import it when an array view is requested.
+        # the array shares memory with the grid, shape (height, width)
+        import numpy
+        return numpy.frombuffer(self.grid, dtype=numpy.uint8).reshape(
+            self.height, self.width
+        )
+
     def prettyprint_world(self):
         for row in self.world_map:
             for ele in row:
@@ -98,12 +275,33 @@ class World:
 
 
     def find_goals(self):
-        for row in self.world_map:
-            for ele in row:
-                if ele in World.GOAL_CELLS:
-                    self.goals.append(ele)
+        for cell in World.GOAL_CELLS:
+            self.goals.extend(cell * self.grid.count(World.CELL_CODES[cell]))
         self.goals.sort()
 
+    def index_landmarks(self):
+        self.landmarks = {cell: set() for cell in World.LANDMARK_CELLS}
+        for cell, positions in self.landmarks.items():
+            code = World.CELL_CODES[cell]
+            i = self.grid.find(code)
+            while i != -1:
+                positions.add((i % self.width, i // self.width))
+                i = self.grid.find(code, i+1)
+
+    def index_walls(self):
+        self.row_walls = [[] for y in range(self.height)]
+        self.col_walls = [[] for x in range(self.width)]
+        for cell in World.WALL_CELLS:
+            code = World.CELL_CODES[cell]
+            i = self.grid.find(code)
+            while i != -1:
+                self.row_walls[i // self.width].append(i % self.width)
+                self.col_walls[i % self.width].append(i // self.width)
+                i = self.grid.find(code, i+1)
+        if len(World.WALL_CELLS) > 1:
+            for walls in self.row_walls + self.col_walls:
+                walls.sort()
+
     def get_width(self):
         return self.width
 
@@ -123,22 +321,40 @@ class World:
         return self.face_dirB
 
     def get_cell(self, x, y):
-        return self.world_map[y][x]
+        return chr(self.grid[y*self.width + x])
+
+    def get_cell_code(self, x, y):
+        return self.grid[y*self.width + x]
     
     def set_cell(self, x, y, flag):
-        self.world_map[y][x] = flag
+        i = y*self.width + x
+        old = chr(self.grid[i])
+        self.grid[i] = World.CELL_CODES[flag]
+        self.changed.add(i)
+
+        # keep the landmark index in sync
+        if old in self.landmarks:
+            self.landmarks[old].discard((x, y))
+        if flag in self.landmarks:
+            self.landmarks[flag].add((x, y))
+
+        # and the sight tables, if a wall appeared or disappeared
+        was_wall = World.WALL_MASK[World.CELL_CODES[old]]
+        is_wall = World.WALL_MASK[self.grid[i]]
+        if self.row_walls is not None and was_wall != is_wall:
+            if is_wall:
+                bisect.insort(self.row_walls[y], x)
+                bisect.insort(self.col_walls[x], y)
+            else:
+                self.row_walls[y].remove(x)
+                self.col_walls[x].remove(y)
 
     def is_valid_cell(self, x, y):
-        try:
-            self.world_map[y][x]
-            return True
-        except IndexError:
-            return False
+        return 0 <= x < self.width and 0 <= y < self.height
 
     def is_cell_enterable(self, x, y):
-        if self.is_valid_cell(x, y):
-            cell = self.get_cell(x, y)
-            return cell not in World.WALL_CELLS
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return not World.WALL_MASK[self.grid[y*self.width + x]]
         else:
             return False
 
@@ -156,35 +372,103 @@ class World:
         return cells
 
     def raycast(self, x, y, dx, dy):
-        cells = []
-        nx = x+dx
-        ny = y+dy
-        while self.is_valid_cell(nx, ny):
-            cells.append(self.get_cell(nx,ny))
-            nx = nx+dx
-            ny = ny+dy
-        return cells
+        # straight rays are just slices of the grid
+        i = y*self.width + x
+        if (dx, dy) == (1, 0):
+            ray = self.grid[i+1:(y+1)*self.width]
+        elif (dx, dy) == (-1, 0):
+            ray = self.grid[y*self.width:i][::-1]
+        elif (dx, dy) == (0, 1):
+            ray = self.grid[i+self.width::self.width]
+        elif (dx, dy) == (0, -1):
+            ray = self.grid[x:i:self.width][::-1]
+        else:
+            cells = []
+            nx = x+dx
+            ny = y+dy
+            while self.is_valid_cell(nx, ny):
+                cells.append(self.get_cell(nx,ny))
+                nx = nx+dx
+                ny = ny+dy
+            return cells
+        return list(ray.decode('ascii'))
 
     def prune_raycast(self, cells):
+        if not cells:
+            return cells
         for i in range(len(cells)):
             if cells[i] in World.WALL_CELLS:
                 break
         return cells[:i+1]
 
-    def find_cell(self, flag):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
-                cell = self.get_cell(x, y)
-                if cell == flag:
-                    return (x, y)
+    def sight_slice(self, x, y, dx, dy):
+        # slice of the flat grid covering the ray from (x, y) up to and
+        # including the first wall, or None if the ray isn't straight
+        if self.row_walls is None:
+            self.index_walls()
+
+        i = y*self.width + x
+        if (dx, dy) == (1, 0):
+            walls = self.row_walls[y]
+            k = bisect.bisect_right(walls, x)
+            end = walls[k] if k < len(walls) else self.width - 1
+            return slice(i+1, y*self.width + end+1)
+        elif (dx, dy) == (-1, 0):
+            walls = self.row_walls[y]
+            k = bisect.bisect_left(walls, x)
+            start = walls[k-1] if k > 0 else 0
+            if x == 0:
+                return slice(0, 0)
+            stop = y*self.width + start-1
+            return slice(i-1, stop if stop >= 0 else None, -1)
+        elif (dx, dy) == (0, 1):
+            walls = self.col_walls[x]
+            k = bisect.bisect_right(walls, y)
+            end = walls[k] if k < len(walls) else self.height - 1
+            return slice(i+self.width, end*self.width + x+1, self.width)
+        elif (dx, dy) == (0, -1):
+            walls = self.col_walls[x]
+            k = bisect.bisect_left(walls, y)
+            start = walls[k-1] if k > 0 else 0
+            if y == 0:
+                return slice(0, 0)
+            stop = (start-1)*self.width + x
+            return slice(i-self.width, stop if stop >= 0 else None, -self.width)
         return None
 
+    def sightline(self, x, y, dx, dy):
+        # same as prune_raycast(raycast(...)) for straight rays, but looks up
+        # the nearest wall in the sight tables instead of walking the ray
+        ray = self.sight_slice(x, y, dx, dy)
+        if ray is None:
+            return self.prune_raycast(self.raycast(x, y, dx, dy))
+        return list(self.grid[ray].decode('ascii'))
+
+    def find_cell(self, flag):
+        # landmarks are indexed, return the first one in row-major order
+        if flag in self.landmarks:
+            positions = self.landmarks[flag]
+            if not positions:
+                return None
+            return min(positions, key=lambda p: (p[1], p[0]))
+
+        i = self.grid.find(World.CELL_CODES[flag])
+        if i == -1:
+            return None
+        return (i % self.width, i // self.width)
+
     def swap_all_cells(self, flagA, flagB):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
-                cell = self.get_cell(x, y)
-                if cell == flagA:
-                    self.set_cell(x, y, flagB)
+        # only visit the indexed occurrences when we can
+        if flagA in self.landmarks:
+            for x, y in list(self.landmarks[flagA]):
+                self.set_cell(x, y, flagB)
+        else:
+            # every cell goes through set_cell so reset knows which ones changed
+            code = World.CELL_CODES[flagA]
+            i = self.grid.find(code)
+            while i != -1:
+                self.set_cell(i % self.width, i // self.width, flagB)
+                i = self.grid.find(code, i+1)
 
     def check_triggers(self, x, y, cmd):
         if self.is_valid_cell(x, y):
@@ -221,3 +505,27 @@ class World:
                 return ["GOAL_TRIGGERED", len(self.goals), cell]
                 
         return ["NONE"]
+
+
+def main():
+    # compiles a text world into the binary format, which loads without parsing
+    args = sys.argv
+    if "-h" in args or len(args) != 3:
+        print(
+            "Usage: world.py WORLD COMPILED\n"
+            "  writes WORLD in the compiled format, which any tool taking a world can load"
+        )
+        return
+
+    the_world = World(args[1])
+    try:
+        the_world.load_world()
+    except (misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+        return
+    if the_world.grid:
+        the_world.save_compiled(args[2])
+
+
+if __name__ == "__main__":
+    main()
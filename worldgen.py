@@ -0,0 +1,264 @@
+import re
+import sys
+import random
+import world
+import misc
+
+HELP = """Usage: worldgen.py OUT [-n SIZE] [-s SEED] [-d DENSITY] [-r ROOMS] [-g GOALS] [-t PAIRS] [-c]
+  Generates a random world and writes it to OUT.
+  SIZE is WIDTHxHEIGHT or one number for a square world (default 32)
+  -d is the fraction of open cells turned into scattered walls (default 0.1)
+  -r is the number of rooms joined by corridors, 0 for one open cave
+     (default one per 150 cells)
+  -g is the number of goals, at most 10 (default 3)
+  -t is the number of transporter pairs, at most 2 (default 1)
+  -c writes the compiled format instead of text"""
+
+FLOOR = b"g"
+WALL = b"w"
+OPEN_RUN = re.compile(rb"[^w]+")
+
+ROOM_MIN = 3
+ROOM_MAX = 12
+CELLS_PER_ROOM = 150
+
+# the two kinds of transporter, each end takes you to the other
+TRANSPORTER_PAIRS = [("b", "o"), ("y", "p")]
+
+
+def generate_world(width, height, seed=None, wall_density=0.1, rooms=None, goals=3, transporters=1):
+    # a random world that any agent can finish: every open cell is reachable from
+    # every other, so the start, the exit, the goals and the transporters are all
+    # connected. the same arguments always give the same world
+    if width < 3 or height < 3:
+        raise misc.InvalidWorldException(f"A world must be at least 3x3, not {width}x{height}.")
+    if goals > len(world.World.GOAL_CELLS):
+        raise misc.InvalidWorldException(f"A world can have at most {len(world.World.GOAL_CELLS)} goals.")
+    if transporters > len(TRANSPORTER_PAIRS):
+        raise misc.InvalidWorldException(f"A world can have at most {len(TRANSPORTER_PAIRS)} transporter pairs.")
+
+    rng = random.Random(seed)
+    grid = bytearray(WALL * (width * height))
+
+    if rooms is None:
+        rooms = max(1, width * height // CELLS_PER_ROOM)
+    if rooms:
+        carve_rooms(grid, width, height, rooms, rng)
+    else:
+        for y in range(1, height - 1):
+            grid[y*width + 1:(y+1)*width - 1] = FLOOR * (width - 2)
+
+    scatter_walls(grid, width, wall_density, rng)
+    open_cells = fill_unreachable(grid, width, height)
+
+    # the start, exit, goals and transporters each need a cell of their own
+    landmarks = ["r"] + world.World.GOAL_CELLS[:goals]
+    for pair in TRANSPORTER_PAIRS[:transporters]:
+        landmarks.extend(pair)
+    if open_cells < len(landmarks) + 1:
+        raise misc.InvalidWorldException(
+            f"A {width}x{height} world with wall density {wall_density} has too few open cells."
+        )
+
+    # both agents start on the same cell facing the same way, like the bundled
+    # worlds, since their shared map is laid out around where they started
+    taken = set()
+    start = floor_cell(grid, width, rng, taken)
+    for cell in landmarks:
+        grid[floor_cell(grid, width, rng, taken)] = world.World.CELL_CODES[cell]
+
+    the_world = world.World(f"generated-{width}x{height}-{seed}")
+    the_world.width = width
+    the_world.height = height
+    the_world.grid = grid
+    the_world.start_xA, the_world.start_yA = start % width, start // width
+    the_world.start_xB, the_world.start_yB = start % width, start // width
+    the_world.face_dirA = the_world.face_dirB = rng.choice(world.World.DIRECTIONS)
+    the_world.index_world()
+    return the_world
+
+
+def carve_rooms(grid, width, height, rooms, rng):
+    centres = []
+    for room in range(rooms):
+        w = min(rng.randint(ROOM_MIN, ROOM_MAX), width - 2)
+        h = min(rng.randint(ROOM_MIN, ROOM_MAX), height - 2)
+        x = rng.randint(1, width - 1 - w)
+        y = rng.randint(1, height - 1 - h)
+        for row in range(y, y + h):
+            grid[row*width + x:row*width + x + w] = FLOOR * w
+        centres.append((x + w // 2, y + h // 2))
+
+    # join each room to the next along a snake through bands of rows, which
+    # keeps the corridors short and the rooms one connected tree
+    band = 2 * ROOM_MAX
+    centres.sort(key=lambda c: (c[1] // band, c[0] if c[1] // band % 2 == 0 else -c[0]))
+    for (x0, y0), (x1, y1) in zip(centres, centres[1:]):
+        if rng.random() < 0.5:
+            carve_row(grid, width, y0, x0, x1)
+            carve_column(grid, width, x1, y0, y1)
+        else:
+            carve_column(grid, width, x0, y0, y1)
+            carve_row(grid, width, y1, x0, x1)
+
+
+def carve_row(grid, width, y, x0, x1):
+    x0, x1 = min(x0, x1), max(x0, x1)
+    grid[y*width + x0:y*width + x1 + 1] = FLOOR * (x1 - x0 + 1)
+
+
+def carve_column(grid, width, x, y0, y1):
+    y0, y1 = min(y0, y1), max(y0, y1)
+    grid[y0*width + x:y1*width + x + 1:width] = FLOOR * (y1 - y0 + 1)
+
+
+def scatter_walls(grid, width, density, rng):
+    # walls only go in the middle of open space, with nothing but open cells all
+    # around them, so no two touch and none of them can cut a region in two
+    count = int(grid.count(FLOOR) * density)
+    for attempt in range(4 * count):
+        if count == 0:
+            break
+        i = width + 1 + int(rng.random() * (len(grid) - 2*width - 2))
+        if WALL in grid[i-width-1:i-width+2] or WALL in grid[i-1:i+2] or WALL in grid[i+width-1:i+width+2]:
+            continue
+        grid[i] = WALL[0]
+        count -= 1
+
+
+def fill_unreachable(grid, width, height):
+    # finds the connected regions of open cells a row at a time, joining each run
+    # of open cells to the runs it touches in the row above, then walls in all
+    # but the biggest region. returns how many open cells are left
+    parent = []
+    size = []
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    runs = []
+    above = []
+    for y in range(height):
+        row = []
+        j = 0
+        for match in OPEN_RUN.finditer(grid, y*width, (y+1)*width):
+            start, end = match.span()
+            run = len(runs)
+            runs.append((start, end))
+            parent.append(run)
+            size.append(end - start)
+
+            while j < len(above) and runs[above[j]][1] + width <= start:
+                j += 1
+            k = j
+            while k < len(above) and runs[above[k]][0] + width < end:
+                a, b = find(run), find(above[k])
+                if a != b:
+                    if size[a] < size[b]:
+                        a, b = b, a
+                    parent[b] = a
+                    size[a] += size[b]
+                k += 1
+            row.append(run)
+        above = row
+
+    if not runs:
+        return 0
+
+    biggest = max((run for run in range(len(runs)) if parent[run] == run), key=lambda run: size[run])
+    for run, (start, end) in enumerate(runs):
+        if find(run) != biggest:
+            grid[start:end] = WALL * (end - start)
+    return size[biggest]
+
+
+def floor_cell(grid, width, rng, taken):
+    # a random open cell nothing else has been put on yet
+    floor = FLOOR[0]
+    while True:
+        i = rng.randrange(width, len(grid) - width)
+        if grid[i] == floor and i not in taken:
+            taken.add(i)
+            return i
+
+
+def parse_size(arg):
+    # accepts "64" or "128x64"
+    if "x" in arg:
+        width, height = arg.split("x")
+        return int(width), int(height)
+    return int(arg), int(arg)
+
+
+def main():
+
+    out_filename = None
+    width, height = 32, 32
+    seed = None
+    wall_density = 0.1
+    rooms = None
+    goals = 3
+    transporters = 1
+    compiled = False
+
+    args = sys.argv
+
+    if "-h" in args or len(args) < 2:
+        print(HELP)
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-n":
+                width, height = parse_size(args[i+1])
+                i += 1
+            elif args[i] == "-s":
+                seed = int(args[i+1])
+                i += 1
+            elif args[i] == "-d":
+                wall_density = float(args[i+1])
+                i += 1
+            elif args[i] == "-r":
+                rooms = int(args[i+1])
+                i += 1
+            elif args[i] == "-g":
+                goals = int(args[i+1])
+                i += 1
+            elif args[i] == "-t":
+                transporters = int(args[i+1])
+                i += 1
+            elif args[i] == "-c":
+                compiled = True
+            else:
+                out_filename = args[i]
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    if out_filename is None:
+        print("Output file missing. Run with -h for help.")
+        return
+
+    try:
+        the_world = generate_world(width, height, seed, wall_density, rooms, goals, transporters)
+    except misc.InvalidWorldException as e:
+        print(e)
+        return
+
+    if compiled:
+        the_world.save_compiled(out_filename)
+    else:
+        the_world.save_text(out_filename)
+
+
+if __name__ == "__main__":
+    main()